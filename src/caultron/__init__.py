@@ -1,32 +1,108 @@
-from .ca import (
-    derive_key,
-    evolve,
-    generate_salt,
-    get_mid_end,
-    prepare_secrets,
-    xor_blocks,
-)
-from .chacha20 import chacha20_encrypt
-from .visualize import (
-    print_rule_for_seed,
-    run_ca,
-    visualize_ca,
-    visualize_entropy_over_time,
-    visualize_hamming_vs_counter,
-)
+"""
+Public names are imported lazily on first access, so `import caultron` does not
+pay for numba (or matplotlib, needed only by the plotting helpers) up front.
+"""
+
+import importlib
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .aio import AsyncDeriver, aderive_key
+    from .batch import derive_keys, derive_keys_lockstep
+    from .ca import (
+        derive_key,
+        evolve,
+        generate_salt,
+        get_mid_end,
+        prepare_secrets,
+        state_to_bytes,
+        xor_blocks,
+    )
+    from .cache import KeyCache
+    from .chacha20 import chacha20_encrypt, chacha20_keystream, chacha20_keystreams
+    from .checkpoint import derive_key_resumable
+    from .history import iter_ca, open_history
+    from .rules import compile_rule
+    from .stats import DeriveStats
+    from .tan import derive_tan_list
+    from .visualize import (
+        print_rule_for_seed,
+        run_ca,
+        visualize_ca,
+        visualize_entropy_over_time,
+        visualize_hamming_vs_counter,
+    )
+    from .warmup import warm_up
+
+_LAZY = {
+    "AsyncDeriver": "aio",
+    "aderive_key": "aio",
+    "derive_keys": "batch",
+    "derive_keys_lockstep": "batch",
+    "KeyCache": "cache",
+    "derive_key": "ca",
+    "evolve": "ca",
+    "generate_salt": "ca",
+    "get_mid_end": "ca",
+    "prepare_secrets": "ca",
+    "state_to_bytes": "ca",
+    "xor_blocks": "ca",
+    "derive_key_resumable": "checkpoint",
+    "chacha20_encrypt": "chacha20",
+    "chacha20_keystream": "chacha20",
+    "chacha20_keystreams": "chacha20",
+    "iter_ca": "history",
+    "open_history": "history",
+    "compile_rule": "rules",
+    "DeriveStats": "stats",
+    "derive_tan_list": "tan",
+    "warm_up": "warmup",
+    "print_rule_for_seed": "visualize",
+    "run_ca": "visualize",
+    "visualize_ca": "visualize",
+    "visualize_entropy_over_time": "visualize",
+    "visualize_hamming_vs_counter": "visualize",
+}
 
 __all__ = [
+    "AsyncDeriver",
+    "aderive_key",
+    "DeriveStats",
+    "KeyCache",
     "chacha20_encrypt",
+    "chacha20_keystream",
+    "chacha20_keystreams",
     "xor_blocks",
     "generate_salt",
     "evolve",
+    "compile_rule",
     "get_mid_end",
     "run_ca",
+    "iter_ca",
+    "open_history",
     "visualize_ca",
     "print_rule_for_seed",
     "visualize_entropy_over_time",
     "run_ca",
     "prepare_secrets",
+    "state_to_bytes",
     "derive_key",
+    "derive_key_resumable",
+    "derive_tan_list",
+    "derive_keys",
+    "derive_keys_lockstep",
     "visualize_hamming_vs_counter",
+    "warm_up",
 ]
+
+
+def __getattr__(name):
+    if name not in _LAZY:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{_LAZY[name]}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY))
@@ -1,10 +1,13 @@
-from .ca import derive_key, prepare_secrets
+import argparse
+import json
+import sys
 
-if __name__ == "__main__":
-    import argparse
 
+def derive(argv):
     parser = argparse.ArgumentParser(
-        description="CAultron: Quantum-inspired CA key derivation."
+        prog="python -m caultron",
+        description="CAultron: Quantum-inspired CA key derivation.",
+        epilog=f"Other commands: {', '.join(COMMANDS)}.",
     )
     parser.add_argument(
         "--password", type=str, required=True, help="Password or secret"
@@ -12,12 +15,359 @@ if __name__ == "__main__":
     parser.add_argument("--salt", type=str, required=True, help="Salt (hex or string)")
     parser.add_argument("--counter", type=int, default=1, help="Iteration counter")
     parser.add_argument("--size", type=int, default=1024, help="Universe size")
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+
+    from .batch import parse_salt
+    from .ca import derive_key, prepare_secrets
 
     secrets = prepare_secrets(args.password)
+    key = derive_key(secrets, parse_salt(args.salt), args.counter, size=args.size)
+    print(key.hex())
+
+
+def batch(argv):
+    parser = argparse.ArgumentParser(
+        prog="python -m caultron batch",
+        description=(
+            "Derive many keys in one process. Results are written as JSON lines, "
+            "in input order, as soon as they are available."
+        ),
+    )
+    parser.add_argument(
+        "--counters",
+        type=str,
+        help="Counter range FIRST-LAST (inclusive), with --password and --salt",
+    )
+    parser.add_argument("--password", type=str, help="Password or secret")
+    parser.add_argument("--salt", type=str, help="Salt (hex or string)")
+    parser.add_argument(
+        "--input",
+        type=argparse.FileType("r"),
+        help="JSON-lines requests with password, salt, counter and optionally "
+        "size, engine and id ('-' for stdin)",
+    )
+    parser.add_argument(
+        "--size", type=int, default=1024, help="Universe size (default for requests)"
+    )
+    parser.add_argument(
+        "--engine", choices=("bool", "packed"), default="packed", help="CA engine"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=1, help="Worker processes (0: one per CPU)"
+    )
+    parser.add_argument(
+        "--chunksize", type=int, default=1, help="Requests per worker task"
+    )
+    args = parser.parse_args(argv)
+    if (args.counters is None) == (args.input is None):
+        parser.error("give either --counters or --input")
+
+    from .batch import derive_json_lines, derive_keys, parse_salt
+    from .ca import prepare_secrets
+
+    if args.input is not None:
+        with args.input:
+            for result in derive_json_lines(
+                args.input, args.size, args.engine, args.workers, args.chunksize
+            ):
+                print(result, flush=True)
+        return
+
+    if args.password is None or args.salt is None:
+        parser.error("--counters needs --password and --salt")
     try:
-        salt = bytes.fromhex(args.salt)
+        first, _, last = args.counters.partition("-")
+        counters = range(int(first), int(last or first) + 1)
     except ValueError:
-        salt = args.salt.encode()
-    key = derive_key(secrets, salt, args.counter, size=args.size)
-    print(key.hex())
+        parser.error(f"invalid counter range {args.counters!r}")
+    keys = derive_keys(
+        prepare_secrets(args.password),
+        parse_salt(args.salt),
+        counters,
+        size=args.size,
+        workers=args.workers,
+        chunksize=args.chunksize,
+        engine=args.engine,
+    )
+    for counter, key in zip(counters, keys):
+        print(json.dumps({"counter": counter, "key": key.hex()}), flush=True)
+
+
+def calibrate(argv):
+    parser = argparse.ArgumentParser(
+        prog="python -m caultron calibrate",
+        description="Find the universe size that makes derive_key take a target time.",
+    )
+    parser.add_argument(
+        "--target-ms", type=float, default=250.0, help="Target latency in ms"
+    )
+    parser.add_argument(
+        "--engine", choices=("bool", "packed"), default="packed", help="CA engine"
+    )
+    parser.add_argument(
+        "--counters", type=int, default=8, help="Derivations per measured size"
+    )
+    parser.add_argument(
+        "--check",
+        type=int,
+        default=16,
+        metavar="N",
+        help="Verify the median size with N derivations (0: skip)",
+    )
+    args = parser.parse_args(argv)
+
+    import numpy as np
+
+    from .calibrate import calibrate, latencies
+
+    result = calibrate(args.target_ms, args.counters, args.engine)
+    print(f"{'size':>10}{'ms/step':>10}{'median ms':>12}{'worst ms':>10}")
+    for size, step_s in result.measured:
+        print(
+            f"{size:>10}{step_s * 1e3:>10.4f}{step_s * result.median_steps * 1e3:>12.1f}"
+            f"{step_s * result.max_steps * 1e3:>10.1f}"
+        )
+    print(
+        f"Target {args.target_ms:g} ms:\n"
+        f"  size {result.median_size} for the median derivation "
+        f"({result.median_steps} steps)\n"
+        f"  size {result.worst_size} for the slowest derivation "
+        f"({result.max_steps} steps)"
+    )
+    if args.check:
+        times = latencies(result.median_size, args.check, args.engine) * 1e3
+        print(
+            f"Measured at size {result.median_size} over {args.check} counters: "
+            f"median {np.median(times):.1f} ms, max {times.max():.1f} ms"
+        )
+
+
+def render(argv):
+    parser = argparse.ArgumentParser(
+        prog="python -m caultron render",
+        description=(
+            "Render a CA evolution, or a history file, as a PNG in bounded memory "
+            "and without a display."
+        ),
+    )
+    parser.add_argument("output", help="PNG file to write")
+    parser.add_argument("--history", type=str, help="History file to render")
+    parser.add_argument("--seed", type=str, help="Seed to evolve (64 hex digits)")
+    parser.add_argument("--steps", type=int, default=100, help="Steps to evolve")
+    parser.add_argument("--size", type=int, default=1024, help="Universe size")
+    parser.add_argument("--width", type=int, default=1024, help="Maximum width")
+    parser.add_argument("--height", type=int, default=1024, help="Maximum height")
+    parser.add_argument(
+        "--entropy-width",
+        type=int,
+        default=0,
+        help="Width of an entropy strip on the right (0: none)",
+    )
+    args = parser.parse_args(argv)
+    if (args.history is None) == (args.seed is None):
+        parser.error("give either --history or --seed")
+
+    from .render import render_evolution_png, render_history_png
+
+    options = {
+        "width": args.width,
+        "height": args.height,
+        "entropy_width": args.entropy_width,
+    }
+    if args.history is not None:
+        result = render_history_png(args.history, args.output, **options)
+    else:
+        try:
+            seed = bytes.fromhex(args.seed)
+        except ValueError:
+            parser.error("the seed must be hex")
+        result = render_evolution_png(
+            seed, args.output, args.steps, args.size, **options
+        )
+    print(
+        f"{args.output}: {result.width}x{result.height} pixels, "
+        f"{result.cells_per_pixel} cells x {result.steps_per_pixel} steps per pixel"
+    )
+
+
+def serve(argv):
+    parser = argparse.ArgumentParser(
+        prog="python -m caultron serve",
+        description=(
+            "Run a key derivation daemon with warm kernels on a Unix socket "
+            "(see caultron.serve for the protocol), or query a running one."
+        ),
+    )
+    parser.add_argument(
+        "--socket",
+        type=str,
+        help="Socket path (default: $CAULTRON_SOCKET, or caultron.sock in "
+        "$XDG_RUNTIME_DIR or in a private caultron-<uid> directory in the temp dir)",
+    )
+    parser.add_argument(
+        "--workers", type=int, help="Derivation threads (default: one per CPU)"
+    )
+    parser.add_argument(
+        "--max-pending",
+        type=int,
+        help="Derivations admitted at once (default: twice the workers)",
+    )
+    parser.add_argument(
+        "--stats",
+        action="store_true",
+        help="Print the counters of the running daemon and exit",
+    )
+    args = parser.parse_args(argv)
+
+    from .serve import Client, default_socket_path, run
+
+    path = args.socket or default_socket_path()
+    try:
+        if args.stats:
+            with Client(path) as client:
+                print(json.dumps(client.stats(), indent=1))
+            return
+        print(f"Serving on {path}", flush=True)
+        # without --socket, run creates the private default directory
+        run(args.socket, args.workers, args.max_pending)
+    except OSError as e:
+        sys.exit(f"error: {e}")
+
+
+def shard(argv):
+    parser = argparse.ArgumentParser(
+        prog="python -m caultron shard",
+        description=(
+            "Derive a counter range split into shards, e.g. one or more per machine: "
+            "plan a manifest, run each shard (restartable), merge the shard files."
+        ),
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    plan = commands.add_parser("plan", help="Write a manifest for a counter range")
+    plan.add_argument("manifest", help="Manifest file to write")
+    plan.add_argument(
+        "--counters", type=str, required=True, help="Counter range FIRST-LAST"
+    )
+    plan.add_argument("--shards", type=int, required=True, help="Number of shards")
+    plan.add_argument("--password", type=str, required=True, help="Password or secret")
+    plan.add_argument("--salt", type=str, required=True, help="Salt (hex or string)")
+    plan.add_argument("--size", type=int, default=1024, help="Universe size")
+    run = commands.add_parser("run", help="Derive (or resume) one shard")
+    run.add_argument("manifest", help="Manifest file")
+    run.add_argument("--index", type=int, required=True, help="Shard index")
+    run.add_argument("--password", type=str, required=True, help="Password or secret")
+    run.add_argument(
+        "--output", type=str, help="Shard file (default: MANIFEST.INDEX.shard)"
+    )
+    run.add_argument(
+        "--engine", choices=("bool", "packed"), default="packed", help="CA engine"
+    )
+    run.add_argument(
+        "--workers", type=int, default=1, help="Worker processes (0: one per CPU)"
+    )
+    run.add_argument(
+        "--chunksize", type=int, default=1, help="Counters per worker task"
+    )
+    status = commands.add_parser("status", help="Show the progress of shard files")
+    status.add_argument("shards", nargs="+", help="Shard files")
+    merge = commands.add_parser("merge", help="Check and merge the shard files")
+    merge.add_argument("manifest", help="Manifest file")
+    merge.add_argument("shards", nargs="+", help="Shard files, one per shard")
+    merge.add_argument("--output", type=str, required=True, help="Key file to write")
+    merge.add_argument(
+        "--jsonl", action="store_true", help="Write JSON lines instead of raw keys"
+    )
+    args = parser.parse_args(argv)
+
+    from .batch import parse_salt
+    from .ca import prepare_secrets
+    from .shard import (
+        derive_shard,
+        load_manifest,
+        merge_shards,
+        plan,
+        read_shard_header,
+        save_manifest,
+    )
+
+    try:
+        if args.command == "plan":
+            try:
+                first, _, last = args.counters.partition("-")
+                counters = range(int(first), int(last or first) + 1)
+            except ValueError:
+                parser.error(f"invalid counter range {args.counters!r}")
+            manifest = plan(
+                prepare_secrets(args.password),
+                parse_salt(args.salt),
+                counters,
+                args.shards,
+                args.size,
+            )
+            save_manifest(args.manifest, manifest)
+            for index, (first, last) in enumerate(manifest.shards):
+                print(f"shard {index}: counters {first}-{last}")
+        elif args.command == "run":
+            output = args.output or f"{args.manifest}.{args.index}.shard"
+            derived = derive_shard(
+                prepare_secrets(args.password),
+                load_manifest(args.manifest),
+                args.index,
+                output,
+                workers=args.workers,
+                chunksize=args.chunksize,
+                engine=args.engine,
+            )
+            header = read_shard_header(output)
+            print(
+                f"{output}: {derived} keys derived, "
+                f"{header.done}/{header.last - header.first + 1} done"
+            )
+        elif args.command == "status":
+            for path in args.shards:
+                header = read_shard_header(path)
+                print(
+                    f"{path}: shard {header.index}, counters "
+                    f"{header.first}-{header.last}, "
+                    f"{header.done}/{header.last - header.first + 1} done"
+                )
+        else:
+            count = merge_shards(
+                load_manifest(args.manifest), args.shards, args.output, args.jsonl
+            )
+            print(f"{args.output}: {count} keys")
+    except (AssertionError, OSError, ValueError) as e:
+        sys.exit(f"error: {e}")
+
+
+def warmup(argv):
+    parser = argparse.ArgumentParser(
+        prog="python -m caultron warmup",
+        description="Compile all kernels into numba's on-disk cache.",
+    )
+    parser.parse_args(argv)
+
+    from .warmup import warm_up
+
+    print(f"Kernels ready in {warm_up():.2f}s")
+
+
+COMMANDS = {
+    "batch": batch,
+    "calibrate": calibrate,
+    "render": render,
+    "serve": serve,
+    "shard": shard,
+    "warmup": warmup,
+}
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] in COMMANDS:
+        return COMMANDS[argv[0]](argv[1:])
+    return derive(argv)
+
+
+if __name__ == "__main__":
+    main()
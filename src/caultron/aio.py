@@ -0,0 +1,101 @@
+"""
+Key derivation for asyncio applications.
+
+derive_key is CPU-bound and would block the event loop for the whole evolution.
+Awaiting it here runs it on a worker thread instead; the packed kernels release
+the GIL, so derivations on different threads also run in parallel.
+"""
+
+import asyncio
+import os
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+from .ca import _derive_key_packed, _derive_seed, get_mid_end
+
+
+class AsyncDeriver:
+    """
+    Derives keys on a pool of `max_workers` threads (default: one per CPU).
+
+    At most `max_pending` derivations (default 2 * max_workers), running or queued,
+    are admitted at once per event loop; further callers wait for a slot, which
+    passes the back-pressure on to them. Cancelling an awaiting task stops its
+    evolution before the next batch of steps (see ca.MASK_BUDGET) and frees its
+    slot.
+    """
+
+    def __init__(self, max_workers: int | None = None, max_pending: int | None = None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = max_pending or 2 * self.max_workers
+        assert self.max_workers >= 1, "Max workers must be a positive int."
+        assert self.max_pending >= 1, "Max pending must be a positive int."
+        self._executor = ThreadPoolExecutor(
+            self.max_workers, thread_name_prefix="caultron"
+        )
+        # asyncio primitives belong to one event loop
+        self._slots = weakref.WeakKeyDictionary()
+
+    async def derive_key(
+        self, secrets: list[bytes], salt: bytes, counter: int, size=1024
+    ) -> bytes:
+        """derive_key without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        slots = self._slots.setdefault(loop, asyncio.Semaphore(self.max_pending))
+        async with slots:
+            cancel = threading.Event()
+            future = loop.run_in_executor(
+                self._executor,
+                _derive_key_cancellable,
+                secrets,
+                salt,
+                counter,
+                size,
+                cancel,
+            )
+            try:
+                return await future
+            except asyncio.CancelledError:
+                cancel.set()
+                raise
+
+    def close(self, wait=True) -> None:
+        """Shut the thread pool down; queued derivations are dropped."""
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close(wait=False)
+
+
+_default: AsyncDeriver | None = None
+_default_lock = threading.Lock()
+
+
+async def aderive_key(
+    secrets: list[bytes], salt: bytes, counter: int, size=1024
+) -> bytes:
+    """
+    derive_key without blocking the event loop, on a shared AsyncDeriver with the
+    default limits. Create an AsyncDeriver to choose the limits.
+    """
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = AsyncDeriver()
+    return await _default.derive_key(secrets, salt, counter, size)
+
+
+def _derive_key_cancellable(
+    secrets: list[bytes],
+    salt: bytes,
+    counter: int,
+    size: int,
+    cancel: threading.Event,
+) -> bytes:
+    seed = _derive_seed(secrets, salt, counter)
+    mid, end = get_mid_end(seed)
+    return _derive_key_packed(seed, counter, size, mid, end, cancel)
@@ -0,0 +1,141 @@
+"""
+Attacker cost estimate: how many password guesses per second an attacker can test
+with the fastest engine in this package.
+
+Run with `python -m caultron.analysis`. Every worker process (one per core by
+default) derives keys for batches of candidate passwords with the lockstep packed
+engine, the way a brute-force search would, and counts the guesses it completes
+after its own JIT warm-up.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import NamedTuple
+
+import numba
+
+from .batch import derive_keys_lockstep
+from .ca import _derive_seed, get_mid_end, prepare_secrets
+from .packed import n_words
+from .rules import MAX_TABLE_SIZE, ROTATIONS
+
+SALT = bytes(range(32))
+
+
+class AttackEstimate(NamedTuple):
+    size: int
+    workers: int
+    guesses: int
+    seconds: float
+    guesses_per_s: float
+    guesses_per_s_per_core: float
+    steps_per_guess: float  # mean evolution steps per candidate
+    bytes_per_guess: int  # working memory of one candidate in the lockstep engine
+
+
+def memory_per_guess(size: int) -> int:
+    """
+    Bytes the lockstep engine holds per candidate: two packed states, the ChaCha20
+    keystream of a step and the compiled rule schedule.
+    """
+    schedule = (ROTATIONS + 1) * (MAX_TABLE_SIZE + 4 * 8)  # tables, flags and bits
+    return 2 * 8 * n_words(size) + size + schedule
+
+
+def estimate(
+    size=1024, seconds=5.0, batch=64, workers: int | None = None, counter=1
+) -> AttackEstimate:
+    """Measure sustained guesses per second over `seconds` on `workers` processes."""
+    workers = workers or os.cpu_count() or 1
+    assert workers >= 1, "Workers must be a positive int."
+    assert batch >= 1, "Batch must be a positive int."
+    guess = partial(_guess_worker, size, seconds, batch, counter)
+    if workers == 1:
+        results = [guess(0)]
+    else:
+        with ProcessPoolExecutor(
+            workers, mp_context=multiprocessing.get_context("spawn")
+        ) as pool:
+            results = list(pool.map(guess, range(workers)))
+    guesses = sum(n for n, _, _ in results)
+    rate = sum(n / elapsed for n, elapsed, _ in results)
+    return AttackEstimate(
+        size,
+        workers,
+        guesses,
+        max(elapsed for _, elapsed, _ in results),
+        rate,
+        rate / workers,
+        sum(steps for _, _, steps in results) / guesses,
+        memory_per_guess(size),
+    )
+
+
+def _guess_worker(
+    size: int, seconds: float, batch: int, counter: int, worker: int
+) -> tuple[int, float, int]:
+    """
+    Guess passwords for `seconds` on one core; returns (guesses, elapsed seconds,
+    steps). The lockstep kernel runs on a single numba thread, so that the rate
+    of every worker is that of one core.
+    """
+    threads = numba.get_num_threads()
+    numba.set_num_threads(1)
+    try:
+        _guess_batch(size, 2, counter, f"warm-up {worker}")
+        guesses = steps = 0
+        start = time.perf_counter()
+        while (elapsed := time.perf_counter() - start) < seconds:
+            steps += _guess_batch(size, batch, counter, f"{worker}:{guesses}")
+            guesses += batch
+    finally:
+        numba.set_num_threads(threads)
+    return guesses, elapsed, steps
+
+
+def _guess_batch(size: int, batch: int, counter: int, prefix: str) -> int:
+    jobs = [(prepare_secrets(f"{prefix}:{n}"), SALT, counter) for n in range(batch)]
+    derive_keys_lockstep(jobs, size=size)
+    return sum(get_mid_end(_derive_seed(*job))[1] - 1 for job in jobs)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m caultron.analysis",
+        description="Estimate the password guesses per second of an attacker.",
+    )
+    parser.add_argument("--size", type=int, default=1024, help="Universe size")
+    parser.add_argument(
+        "--seconds", type=float, default=5.0, help="Measuring time per worker"
+    )
+    parser.add_argument(
+        "--batch", type=int, default=64, help="Candidates evolved in lockstep"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=0, help="Worker processes (0: one per CPU)"
+    )
+    parser.add_argument("--json", action="store_true", help="Print the result as JSON")
+    args = parser.parse_args(argv)
+
+    result = estimate(args.size, args.seconds, args.batch, args.workers)
+    if args.json:
+        print(json.dumps(result._asdict()))
+    else:
+        print(
+            f"size {result.size}, {result.workers} worker(s): "
+            f"{result.guesses} guesses in {result.seconds:.1f} s\n"
+            f"  {result.guesses_per_s:.1f} guesses/s, "
+            f"{result.guesses_per_s_per_core:.1f} guesses/s per core\n"
+            f"  {result.steps_per_guess:.1f} steps and "
+            f"{result.bytes_per_guess} bytes of working memory per guess"
+        )
+    return result
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+"""
+Key derivation for many counters at once.
+
+Every counter seeds its own universe, so derivations are independent and can
+be spread over worker processes.
+"""
+
+import json
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import islice
+from typing import Callable, Generator, Iterable
+
+import numpy as np
+
+from .ca import (
+    _derive_seed,
+    _dual_point_key,
+    _end_nonce,
+    _mid_nonce,
+    _packed_point,
+    _step_nonce,
+    derive_key,
+    get_mid_end,
+    prepare_secrets,
+)
+from .chacha20 import chacha20_keystreams
+from .packed import _step_lockstep_numba, n_words
+from .rules import rule_schedule
+
+
+def derive_keys(
+    secrets: list[bytes],
+    salt: bytes,
+    counters: Iterable[int],
+    size=1024,
+    workers: int | None = None,
+    chunksize: int = 1,
+    engine="packed",
+) -> Generator[bytes, None, None]:
+    """
+    Derive the key for each counter, fanned out over a process pool.
+    Keys are yielded in the order of `counters` as soon as they are available.
+
+    `workers` defaults to the number of CPUs; with workers=1 everything runs in
+    this process. `chunksize` counters are sent to a worker per task, which
+    reduces IPC overhead for small universes. Workers are spawned, so scripts
+    using them need an `if __name__ == "__main__":` guard.
+    """
+    workers = workers or os.cpu_count() or 1
+    assert workers >= 1, "Workers must be a positive int."
+    assert chunksize >= 1, "Chunksize must be a positive int."
+    if workers == 1:
+        for counter in counters:
+            yield derive_key(secrets, salt, counter, size=size, engine=engine)
+        return
+
+    derive_chunk = partial(_derive_chunk, secrets, salt, size=size, engine=engine)
+    for keys in _ordered_map(
+        derive_chunk, _chunked(counters, chunksize), workers, (size, engine)
+    ):
+        yield from keys
+
+
+def derive_keys_lockstep(
+    jobs: Iterable[tuple[list[bytes], bytes, int]], size=1024
+) -> list[bytes]:
+    """
+    Derive the key for every (secrets, salt, counter) job by evolving all universes
+    in lockstep as rows of one packed 2D array, rows stepped in parallel.
+    Each row keeps its own meta_rule rotation and mid/end; keys are returned in job
+    order and are identical to derive_key.
+    """
+    jobs = list(jobs)
+    seeds = [_derive_seed(secrets, salt, counter) for secrets, salt, counter in jobs]
+    return _lockstep_keys(seeds, [counter for _, _, counter in jobs], size)
+
+
+def _lockstep_keys(seeds: list[bytes], counters: list[int], size: int) -> list[bytes]:
+    if not seeds:
+        return []
+    # Rows are sorted by end, longest first, so the rows still evolving at any
+    # step are a prefix of the array and finished rows cost nothing.
+    order = sorted(range(len(seeds)), key=lambda r: -get_mid_end(seeds[r])[1])
+    seeds = [seeds[r] for r in order]
+    counters = [counters[r] for r in order]
+    mids, ends = zip(*map(get_mid_end, seeds))
+    mid_rows, end_rows = {}, {}
+    for r, (mid, end) in enumerate(zip(mids, ends)):
+        mid_rows.setdefault(mid, []).append(r)
+        end_rows.setdefault(end - 1, []).append(r)
+
+    words = np.zeros((len(seeds), n_words(size)), dtype=np.uint64)
+    spare = np.empty_like(words)
+    schedules = [rule_schedule(int.from_bytes(seed[:4], "big")) for seed in seeds]
+    tables = np.stack([schedule.tables for schedule in schedules])
+    flags = np.stack([schedule.flags for schedule in schedules])
+    ks = np.zeros(len(seeds), dtype=np.int64)
+    live = np.zeros(len(seeds), dtype=np.int64)
+
+    midpoints = [b""] * len(seeds)
+    keys = [b""] * len(seeds)
+    active = len(seeds)
+    for i in range(1, ends[0]):
+        while ends[active - 1] <= i:
+            active -= 1
+        nonces = [_step_nonce(counter, i) for counter in counters[:active]]
+        keystreams = chacha20_keystreams(size, seeds[:active], nonces)
+        _step_lockstep_numba(
+            words[:active],
+            spare[:active],
+            keystreams,
+            size,
+            ks[:active],
+            tables[:active],
+            flags[:active],
+            live[:active],
+        )
+        words, spare = spare, words
+        for r in mid_rows.get(i, ()):
+            words[r], live[r], midpoints[r] = _packed_point(
+                words[r], live[r], size, seeds[r], _mid_nonce(i)
+            )
+        for r in end_rows.get(i, ()):
+            _, _, endpoint = _packed_point(
+                words[r], live[r], size, seeds[r], _end_nonce(counters[r])
+            )
+            keys[r] = _dual_point_key(midpoints[r], endpoint)
+
+    result = [b""] * len(seeds)
+    for r, key in zip(order, keys):
+        result[r] = key
+    return result
+
+
+def derive_json_lines(
+    lines: Iterable[str],
+    size=1024,
+    engine="packed",
+    workers: int | None = None,
+    chunksize: int = 1,
+) -> Generator[str, None, None]:
+    """
+    Derive keys for JSON-lines requests, e.g. read from a file.
+
+    Each request is an object with "password", "salt" (hex or string) and
+    "counter", and optionally "size", "engine" and an "id" that is passed through.
+    One JSON line is yielded per non-blank input line, in input order: the
+    counter, size, id and "key" (hex), or the line number and an "error".
+    Requests are spread over `workers` processes as in derive_keys.
+    """
+    workers = workers or os.cpu_count() or 1
+    assert chunksize >= 1, "Chunksize must be a positive int."
+    requests = ((n, line) for n, line in enumerate(lines, 1) if line.strip())
+    derive_chunk = partial(_derive_json_chunk, size=size, engine=engine)
+    for results in _ordered_map(
+        derive_chunk, _chunked(requests, chunksize), workers, (size, engine)
+    ):
+        yield from results
+
+
+def _ordered_map(
+    fn: Callable[[list], list],
+    chunks: Iterable[list],
+    workers: int,
+    warm_up: tuple[int, str],
+) -> Generator[list, None, None]:
+    """
+    fn over chunks, fanned out over a process pool whose workers are warmed up
+    for (size, engine). Results are yielded in order as soon as they are available.
+    """
+    assert workers >= 1, "Workers must be a positive int."
+    if workers == 1:
+        yield from map(fn, chunks)
+        return
+
+    # Forking after numba has started its parallel threads (derive_keys_lockstep)
+    # can deadlock the children, so workers are spawned.
+    pool = ProcessPoolExecutor(
+        workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=warm_up,
+    )
+    pending = deque()
+    try:
+        for chunk in chunks:
+            pending.append(pool.submit(fn, chunk))
+            # keep every worker busy without queueing the whole input up front
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _derive_json_chunk(
+    requests: list[tuple[int, str]], size: int, engine: str
+) -> list[str]:
+    return [_derive_json(n, line, size, engine) for n, line in requests]
+
+
+def _derive_json(n: int, line: str, size: int, engine: str) -> str:
+    request = {}
+    try:
+        request = json.loads(line)
+        assert isinstance(request, dict), "A request must be a JSON object."
+        counter = request["counter"]
+        size = request.get("size", size)
+        assert all(
+            isinstance(n, int) and not isinstance(n, bool) for n in (counter, size)
+        ), "Counter and size must be ints."
+        assert 0 <= counter < 2**64, "Counter must be a non-negative 64-bit int."
+        assert size >= 1, "Size must be a positive int."
+        key = derive_key(
+            prepare_secrets(request["password"]),
+            parse_salt(request["salt"]),
+            counter,
+            size=size,
+            engine=request.get("engine", engine),
+        )
+        result = {"counter": counter, "size": size, "key": key.hex()}
+    except (AssertionError, KeyError, TypeError, ValueError) as e:
+        message = f"missing {e}" if isinstance(e, KeyError) else str(e)
+        result = {"line": n, "error": message or type(e).__name__}
+    if isinstance(request, dict) and "id" in request:
+        result = {"id": request["id"], **result}
+    return json.dumps(result)
+
+
+def parse_salt(salt: str) -> bytes:
+    """A salt given on the command line or in a request: hex, or else the string."""
+    try:
+        return bytes.fromhex(salt)
+    except ValueError:
+        return salt.encode()
+
+
+def _derive_chunk(
+    secrets: list[bytes], salt: bytes, counters: list[int], size: int, engine: str
+) -> list[bytes]:
+    return [derive_key(secrets, salt, c, size=size, engine=engine) for c in counters]
+
+
+def _init_worker(size: int, engine: str) -> None:
+    """
+    Load the compiled kernels once per worker instead of once per task.
+    With numba's on-disk cache (cache=True) this is a cache load, not a recompile.
+    """
+    derive_key([bytes(32)], bytes(32), 1, size=min(size, 64), engine=engine)
+
+
+def _chunked(iterable: Iterable, n: int) -> Generator[list, None, None]:
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, n)):
+        yield chunk
@@ -0,0 +1,342 @@
+"""
+Benchmarks for derive_key and its components.
+
+Run with `python -m caultron.bench`. Every case uses fixed inputs. The first call
+of a case, which includes numba compilation (or loading it from the cache), is
+timed separately from the steady state, and throughput is reported per second
+of the best steady-state run. Use --json to write the results for comparing
+engines, sizes or commits.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from typing import Callable, NamedTuple
+
+import numpy as np
+
+SEED = bytes(range(32))
+SALT = bytes(range(32, 64))
+NONCE = b"bench-nonce!"
+SIZES = (1024, 16384, 131072)
+MASK_STEPS = 16  # steps per batch in the injection_masks and steps cases
+ENGINES = ("bool", "packed", "lockstep")
+
+
+class Case(NamedTuple):
+    name: str
+    engine: str
+    size: int
+    unit: str
+    units: int  # units processed per call
+    fn: Callable[[], object]
+    extra: dict | None = None  # reported with the result
+
+
+class Result(NamedTuple):
+    name: str
+    engine: str
+    size: int
+    unit: str
+    first_s: float  # first call, including JIT compilation or cache load
+    best_s: float  # per call
+    median_s: float  # per call
+    throughput: float  # units per second at best_s
+    extra: dict
+
+
+def cases(size: int, engines=ENGINES, counters=4) -> list[Case]:
+    """The benchmark cases for one universe size."""
+    from .batch import derive_keys_lockstep
+    from .ca import (
+        _calculate_key,
+        _derive_seed,
+        _evolve_rule,
+        bit_entropy,
+        derive_key,
+        get_mid_end,
+        inject_seed,
+    )
+    from .chacha20 import chacha20_encrypt, chacha20_keystream
+    from .packed import (
+        _evolve_packed_rule,
+        _steps_masked_numba,
+        inject_seed_packed,
+        injection_masks,
+        pack_state,
+        packed_state_bytes,
+        popcount,
+    )
+    from .rules import compile_rule, rule_schedule
+
+    rule_bits = int.from_bytes(SEED[:4], "big")
+    rule = compile_rule(rule_bits)
+    schedule = rule_schedule(rule_bits)
+    # Fixtures are built with numpy only, so that the first call of every case
+    # still includes its compilation.
+    rng = np.random.default_rng(0)
+    bits = rng.integers(0, 2, size).astype(bool)
+    words = pack_state(bits)
+    spare = np.empty_like(words)
+    masks = rng.integers(0, 2**64, (MASK_STEPS, len(words)), dtype=np.uint64)
+    nonces = [b"%011d!" % i for i in range(MASK_STEPS)]
+    data = bytes(size)
+
+    secrets = [hashlib.sha256(b"bench").digest()]
+    counter_range = range(1, counters + 1)
+    mid_ends = [get_mid_end(_derive_seed(secrets, SALT, c)) for c in counter_range]
+    derivation = {
+        "counters": list(counter_range),
+        "mid_end": mid_ends,
+        "steps": sum(end - 1 for _, end in mid_ends),
+    }
+
+    result = [
+        Case(
+            "chacha20_keystream",
+            "-",
+            size,
+            "bytes",
+            size,
+            lambda: chacha20_keystream(size, SEED, NONCE),
+        ),
+        Case(
+            "chacha20_encrypt",
+            "-",
+            size,
+            "bytes",
+            size,
+            lambda: chacha20_encrypt(data, SEED, NONCE),
+        ),
+    ]
+    if "bool" in engines:
+        result += [
+            Case(
+                "inject_seed",
+                "bool",
+                size,
+                "cells",
+                size,
+                lambda: inject_seed(bits, SEED, NONCE),
+            ),
+            Case(
+                "evolve", "bool", size, "cells", size, lambda: _evolve_rule(bits, rule)
+            ),
+            Case("entropy", "bool", size, "cells", size, lambda: bit_entropy(bits)),
+            Case("hash", "bool", size, "cells", size, lambda: _calculate_key(bits)),
+            Case(
+                "derive_key",
+                "bool",
+                size,
+                "derivations",
+                counters,
+                lambda: [
+                    derive_key(secrets, SALT, c, size=size, engine="bool")
+                    for c in counter_range
+                ],
+                derivation,
+            ),
+        ]
+    if "packed" in engines:
+        result += [
+            Case(
+                "inject_seed",
+                "packed",
+                size,
+                "cells",
+                size,
+                lambda: inject_seed_packed(words, size, SEED, NONCE),
+            ),
+            Case(
+                "evolve",
+                "packed",
+                size,
+                "cells",
+                size,
+                lambda: _evolve_packed_rule(words, size, rule),
+            ),
+            Case("entropy", "packed", size, "cells", size, lambda: popcount(words)),
+            Case(
+                "hash",
+                "packed",
+                size,
+                "cells",
+                size,
+                lambda: hashlib.sha512(packed_state_bytes(words, size)).digest(),
+            ),
+            # the two halves of every batch of steps in derive_key
+            Case(
+                "injection_masks",
+                "packed",
+                size,
+                "cells",
+                size * MASK_STEPS,
+                lambda: injection_masks(size, SEED, nonces),
+            ),
+            Case(
+                "steps",
+                "packed",
+                size,
+                "cells",
+                size * MASK_STEPS,
+                lambda: _steps_masked_numba(
+                    words.copy(),
+                    spare,
+                    masks,
+                    size,
+                    0,
+                    schedule.tables,
+                    schedule.flags,
+                ),
+            ),
+            Case(
+                "derive_key",
+                "packed",
+                size,
+                "derivations",
+                counters,
+                lambda: [
+                    derive_key(secrets, SALT, c, size=size, engine="packed")
+                    for c in counter_range
+                ],
+                derivation,
+            ),
+        ]
+    if "lockstep" in engines:
+        result.append(
+            Case(
+                "derive_key",
+                "lockstep",
+                size,
+                "derivations",
+                counters,
+                lambda: derive_keys_lockstep(
+                    [(secrets, SALT, c) for c in counter_range], size=size
+                ),
+                derivation,
+            )
+        )
+    return result
+
+
+def measure(case: Case, repeat=5, min_time=0.2) -> Result:
+    """
+    Time one case: a first call on its own, then `repeat` runs of as many calls as
+    it takes to fill `min_time` seconds.
+    """
+    start = time.perf_counter()
+    case.fn()
+    first = time.perf_counter() - start
+
+    number = 1
+    while True:
+        elapsed = _time_calls(case.fn, number)
+        if elapsed >= min_time:
+            break
+        number *= 2
+    samples = [elapsed / number] + [
+        _time_calls(case.fn, number) / number for _ in range(repeat - 1)
+    ]
+    best = min(samples)
+    extra = dict(case.extra or {})
+    if "steps" in extra:
+        extra["step_s"] = best / extra["steps"]
+    return Result(
+        case.name,
+        case.engine,
+        case.size,
+        case.unit,
+        first,
+        best,
+        statistics.median(samples),
+        case.units / best,
+        extra,
+    )
+
+
+def _time_calls(fn: Callable[[], object], number: int) -> float:
+    start = time.perf_counter()
+    for _ in range(number):
+        fn()
+    return time.perf_counter() - start
+
+
+def environment() -> dict:
+    """Versions and hardware the results were measured with."""
+    import numba
+
+    return {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "numba": numba.__version__,
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpus": os.cpu_count(),
+        "numba_threads": numba.get_num_threads(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m caultron.bench",
+        description="Benchmark derive_key and its components.",
+    )
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=SIZES, help="Universe sizes"
+    )
+    parser.add_argument(
+        "--engines", nargs="+", choices=ENGINES, default=ENGINES, help="Engines"
+    )
+    parser.add_argument(
+        "--only", nargs="+", metavar="NAME", help="Only run cases with these names"
+    )
+    parser.add_argument(
+        "--counters", type=int, default=4, help="Counters per derive_key call"
+    )
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per case")
+    parser.add_argument(
+        "--min-time", type=float, default=0.2, help="Minimum seconds per timed run"
+    )
+    parser.add_argument("--json", metavar="PATH", help="Write the results as JSON")
+    args = parser.parse_args(argv)
+    assert args.repeat >= 1, "Repeat must be a positive int."
+
+    results = []
+    print(
+        f"{'case':<20}{'engine':<10}{'size':>9}{'first s':>10}{'best s':>12}"
+        f"{'median s':>12}  throughput"
+    )
+    for size in args.sizes:
+        for case in cases(size, args.engines, args.counters):
+            if args.only and case.name not in args.only:
+                continue
+            r = measure(case, args.repeat, args.min_time)
+            results.append(r)
+            print(
+                f"{r.name:<20}{r.engine:<10}{r.size:>9}{r.first_s:>10.3f}"
+                f"{r.best_s:>12.3g}{r.median_s:>12.3g}  {r.throughput:.4g} {r.unit}/s",
+                flush=True,
+            )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(
+                {
+                    "environment": environment(),
+                    "results": [r._asdict() for r in results],
+                },
+                f,
+                indent=2,
+            )
+        print(f"Results written to {args.json}", file=sys.stderr)
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,42 @@
 import hashlib
 import secrets
+import threading
+import time
+from concurrent.futures import CancelledError
+from contextlib import nullcontext
 from functools import reduce
 
 import numpy as np
 from numba import njit
 
-from .chacha20 import chacha20_encrypt
+from .chacha20 import chacha20_keystream
+from .packed import (
+    _steps_masked_numba,
+    _steps_masked_parallel_numba,
+    inject_seed_packed,
+    injection_masks,
+    n_words,
+    packed_state_bytes,
+    popcount,
+)
+from .rules import (
+    Rule,
+    _rotate_rule,
+    _stagnates,
+    compile_rule,
+    rule_schedule,
+)
+from .stats import NO_STATS, DeriveStats
 
 SEED = 32  # 32 bytes = 256 bits
+ENGINES = ("bool", "packed")
+MASK_BUDGET = 1 << 20  # bytes of injection masks planned at once
+PARALLEL_SIZE = 1 << 20  # universes from this size on are evolved by all threads
+
+# numba's workqueue threading layer aborts the process when parallel kernels run
+# on several threads at once, so their launches are serialized. They use every
+# thread anyway.
+_parallel_lock = threading.Lock()
 
 
 def generate_salt() -> bytes:
@@ -18,40 +47,12 @@ def generate_salt() -> bytes:
 
 
 @njit(cache=True)
-def _evolve_numba(bits, meta_rule_bytes):
-    # Manual big-endian conversion for 4 bytes
-    rule_bits = 0
-    for b in meta_rule_bytes:
-        rule_bits = (rule_bits << 8) | b
-    core_rule = (rule_bits >> 20) & 0xFF
-    neighborhood_size = ((rule_bits >> 18) & 0x3) + 3
-    boundary = (rule_bits >> 17) & 0x1
-    inversion = (rule_bits >> 16) & 0x1
-    modulation = (rule_bits >> 8) & 0xFF
-    temporal = rule_bits & 0xFF
+def _evolve_numba(bits, rule_table, neighborhood_size, boundary, inversion):
+    """One evolution step; returns (new_bits, number of live cells in new_bits)."""
     n = len(bits)
     new_bits = np.zeros_like(bits)
     rule_table_size = 2**neighborhood_size
-    if neighborhood_size == 3:
-        rule_table = np.array(
-            [(core_rule >> i) & 1 for i in range(7, -1, -1)], dtype=np.uint8
-        )
-    else:
-        base = np.array(
-            [(core_rule >> (i % 8)) & 1 for i in range(rule_table_size - 1, -1, -1)],
-            dtype=np.uint8,
-        )
-        mask = np.array(
-            [(modulation >> (i % 8)) & 1 for i in range(rule_table_size - 1, -1, -1)],
-            dtype=np.uint8,
-        )
-        rule_table = base ^ mask
-    if temporal:
-        temporal_mod = temporal % rule_table_size
-        rule_table = np.concatenate((
-            rule_table[temporal_mod:],
-            rule_table[:temporal_mod],
-        ))
+    live = 0
     for i in range(n):
         idxs = np.empty(neighborhood_size, dtype=np.int64)
         for j in range(neighborhood_size):
@@ -72,14 +73,20 @@ def _evolve_numba(bits, meta_rule_bytes):
         if inversion:
             out_bit ^= 1
         new_bits[i] = out_bit
-    return new_bits
+        live += out_bit
+    return new_bits, live
 
 
 def evolve(bits: np.ndarray, seed: bytes) -> np.ndarray:
     assert isinstance(bits, np.ndarray)
     assert isinstance(seed, bytes) and len(seed) == SEED, f"Seed must be {SEED} bytes."
-    meta_rule = seed[:4]
-    return _evolve_numba(bits, meta_rule)
+    return _evolve_rule(bits, compile_rule(int.from_bytes(seed[:4], "big")))[0]
+
+
+def _evolve_rule(bits: np.ndarray, rule: Rule) -> tuple[np.ndarray, int]:
+    return _evolve_numba(
+        bits, rule.table, rule.neighborhood_size, rule.boundary, rule.inversion
+    )
 
 
 def inject_seed(bits: np.ndarray, seed: bytes, nonce: bytes = b"\0" * 12) -> np.ndarray:
@@ -91,18 +98,26 @@ def inject_seed(bits: np.ndarray, seed: bytes, nonce: bytes = b"\0" * 12) -> np.
     assert isinstance(seed, bytes) and len(seed) == SEED, (
         f"Seed must be {SEED} bytes, not {len(seed)}."
     )
-    keystream = chacha20_encrypt(bytes([0] * len(bits)), seed, nonce)
-    keystream_bits = np.frombuffer(keystream, dtype=np.uint8) & 1
+    return _inject_seed_count(bits, seed, nonce)[0]
+
+
+def _inject_seed_count(
+    bits: np.ndarray, seed: bytes, nonce: bytes
+) -> tuple[np.ndarray, int]:
+    keystream_bits = chacha20_keystream(len(bits), seed, nonce) & 1
     return _xor_bits_numba(bits, keystream_bits)
 
 
 @njit(cache=True)
 def _xor_bits_numba(bits, keystream_bits):
+    """XOR the keystream bits into the state; returns (out, number of live cells in out)."""
     n = len(bits)
     out = np.empty_like(bits)
+    live = 0
     for i in range(n):
         out[i] = bits[i] ^ keystream_bits[i]
-    return out
+        live += out[i]
+    return out, live
 
 
 def get_mid_end(seed: bytes) -> tuple[int, int]:
@@ -119,41 +134,190 @@ def get_mid_end(seed: bytes) -> tuple[int, int]:
     return min(a, b), max(a, b)
 
 
-def derive_key(secrets: list[bytes], salt: bytes, counter: int, size=1024) -> bytes:
-    """Evolve the universe for the target counter and derive a key."""
+def derive_key(
+    secrets: list[bytes],
+    salt: bytes,
+    counter: int,
+    size=1024,
+    engine="packed",
+    stats: DeriveStats | None = None,
+) -> bytes:
+    """
+    Evolve the universe for the target counter and derive a key.
+    `engine` selects the state representation: "packed" (64 cells per uint64 word,
+    injections precomputed as packed masks) or the reference "bool" (one cell per
+    byte); both derive identical keys.
+    If a DeriveStats is given, it is filled with per-step phase timings, rule
+    rotations, mid/end and hashing time. Without it there is no instrumentation.
+    """
+    assert engine in ENGINES, f"Engine must be one of {ENGINES}, not {engine!r}."
+    seed = _derive_seed(secrets, salt, counter)
+    mid, end = get_mid_end(seed)
+    if stats is None:
+        derive = _derive_key_packed if engine == "packed" else _derive_key_bool
+        return derive(seed, counter, size, mid, end)
+    start = time.perf_counter()
+    stats._start(engine, size, counter, mid, end)
+    derive = _derive_key_packed if engine == "packed" else _derive_key_bool
+    key = derive(seed, counter, size, mid, end, stats=stats)
+    stats.total_s = time.perf_counter() - start
+    return key
+
+
+def _derive_seed(secrets: list[bytes], salt: bytes, counter: int) -> bytes:
+    counter_block = hashlib.sha256(counter.to_bytes(8, "big")).digest()
+    return xor_blocks(*secrets, counter_block, salt)
+
+
+def _derive_key_bool(
+    seed: bytes,
+    counter: int,
+    size: int,
+    mid: int,
+    end: int,
+    stats: DeriveStats = NO_STATS,
+) -> bytes:
+    """The reference derive_key loop on one bool per cell, timed into `stats`."""
+    clock = time.perf_counter
     state = np.zeros(size, dtype=bool)
 
     midpoint = b""
     endpoint = b""
-    seed = b""
-
-    counter_block = hashlib.sha256(counter.to_bytes(8, "big")).digest()
-    seed = xor_blocks(*secrets, counter_block, salt)
-    mid, end = get_mid_end(seed)
 
-    meta_rule = bytearray(seed[:4])
+    rule_bits = int.from_bytes(seed[:4], "big")
+    live = 0
     for i in range(1, end):
-        state = inject_seed(
-            state, seed, nonce=f"cnt={counter:04d}_step={i:04d}".encode()[:12]
-        )
-        prev_entropy = bit_entropy(state)
-        next_bits = _evolve_numba(state, meta_rule)
-        next_entropy = bit_entropy(next_bits)
-        if abs(next_entropy - prev_entropy) < 0.1:
-            # Rotate rule bits (meta_rule) by 1 bit to the left
-            rule_bits = int.from_bytes(meta_rule, "big")
-            rule_bits = ((rule_bits << 1) | (rule_bits >> 27)) & 0x0FFFFFFF  # 28 bits
-            meta_rule = rule_bits.to_bytes(4, "big")
-        state = next_bits
+        t0 = clock()
+        state, prev = _inject_seed_count(state, seed, _step_nonce(counter, i))
+        t1 = clock()
+        state, live = _evolve_rule(state, compile_rule(rule_bits))
+        t2 = clock()
+        rotated = _stagnates(size, prev, live)
+        if rotated:
+            rule_bits = _rotate_rule(rule_bits)
+        stats._step(t1 - t0, t2 - t1, clock() - t2, live, rotated)
         if i == mid:
-            if all(x == 0 for x in state):
-                state = inject_seed(state, seed, nonce=f"mid={i:<12}".encode()[:12])
+            t0 = clock()
+            if not live:
+                state, live = _inject_seed_count(state, seed, _mid_nonce(i))
             midpoint = _calculate_key(state)
+            stats._hash(clock() - t0)
 
-    if all(x == 0 for x in state):
-        state = inject_seed(state, seed, nonce=f"end={counter:<12}".encode()[:12])
+    t0 = clock()
+    if not live:
+        state, live = _inject_seed_count(state, seed, _end_nonce(counter))
     endpoint = _calculate_key(state)
+    stats._hash(clock() - t0)
 
+    return _dual_point_key(midpoint, endpoint)
+
+
+def _derive_key_packed(
+    seed: bytes,
+    counter: int,
+    size: int,
+    mid: int,
+    end: int,
+    cancel: threading.Event | None = None,
+    stats: DeriveStats = NO_STATS,
+) -> bytes:
+    """
+    The derive_key loop on a bit-packed universe, with the injections of many
+    steps planned at once and one fused kernel call per batch of steps (one step
+    per batch if `stats` records steps).
+    Universes of PARALLEL_SIZE cells or more are evolved by all of numba's threads
+    (see numba.set_num_threads), one such batch at a time. If `cancel` is set, CancelledError is raised
+    before the next batch.
+    """
+    words = np.zeros(n_words(size), dtype=np.uint64)
+    words, live, _, midpoint = _packed_steps(
+        seed, counter, size, mid, words, 0, 0, b"", 1, end, cancel, stats
+    )
+    t0 = time.perf_counter()
+    words, live, endpoint = _packed_point(words, live, size, seed, _end_nonce(counter))
+    stats._hash(time.perf_counter() - t0)
+
+    return _dual_point_key(midpoint, endpoint)
+
+
+def _packed_steps(
+    seed: bytes,
+    counter: int,
+    size: int,
+    mid: int,
+    words: np.ndarray,
+    live: int,
+    k: int,
+    midpoint: bytes,
+    start: int,
+    stop: int,
+    cancel: threading.Event | None = None,
+    stats: DeriveStats = NO_STATS,
+) -> tuple[np.ndarray, int, int, bytes]:
+    """
+    Steps start..stop - 1 of the packed derive_key loop, from the state after step
+    start - 1: `words`, `live`, RuleSchedule index `k` and `midpoint` (b"" until
+    step mid). Returns the same four values after step stop - 1; `words` is updated
+    in place or replaced. Every batch is timed into `stats`.
+    """
+    clock = time.perf_counter
+    spare = np.empty_like(words)
+    schedule = rule_schedule(int.from_bytes(seed[:4], "big"))
+    # The injections of the next steps are planned in batches of at most
+    # MASK_BUDGET bytes; a batch ends at the midpoint, which is hashed in between.
+    batch = 1 if stats.per_step else max(1, MASK_BUDGET // (8 * len(words)))
+    # parallel kernels only pay off (and only fill the threads) for huge universes
+    parallel = size >= PARALLEL_SIZE
+    steps = _steps_masked_parallel_numba if parallel else _steps_masked_numba
+    i = start
+    while i < stop:
+        if cancel is not None and cancel.is_set():
+            raise CancelledError(f"Derivation cancelled before step {i}.")
+        j = min(stop, i + batch, mid + 1 if i <= mid else stop)
+        nonces = [_step_nonce(counter, n) for n in range(i, j)]
+        with _parallel_lock if parallel else nullcontext():
+            t0 = clock()
+            masks = injection_masks(size, seed, nonces, parallel)
+            t1 = clock()
+            prev_k = k
+            live, k = steps(
+                words, spare, masks, size, k, schedule.tables, schedule.flags
+            )
+        # the injection itself and the rotation check run in the evolve kernel
+        stats._step(t1 - t0, clock() - t1, 0.0, live, k != prev_k)
+        if j - 1 == mid:
+            t0 = clock()
+            words, live, midpoint = _packed_point(
+                words, live, size, seed, _mid_nonce(mid)
+            )
+            stats._hash(clock() - t0)
+        i = j
+    return words, live, k, midpoint
+
+
+def _packed_point(
+    words: np.ndarray, live: int, size: int, seed: bytes, nonce: bytes
+) -> tuple[np.ndarray, int, bytes]:
+    """Hash a packed state for the midpoint/endpoint, re-injecting it if all cells died."""
+    if not live:
+        words = inject_seed_packed(words, size, seed, nonce=nonce)
+        live = popcount(words)
+    return words, live, hashlib.sha512(packed_state_bytes(words, size)).digest()
+
+
+def _step_nonce(counter: int, i: int) -> bytes:
+    return f"cnt={counter:04d}_step={i:04d}".encode()[:12]
+
+
+def _mid_nonce(i: int) -> bytes:
+    return f"mid={i:<12}".encode()[:12]
+
+
+def _end_nonce(counter: int) -> bytes:
+    return f"end={counter:<12}".encode()[:12]
+
+
+def _dual_point_key(midpoint: bytes, endpoint: bytes) -> bytes:
     assert midpoint
     assert endpoint
 
@@ -167,12 +331,16 @@ def _calculate_key(bits: np.ndarray) -> bytes:
     """
     Derive a cryptographic key by hashing the full CA state with SHA-512.
     """
-    bitstring = "".join(map(str, bits.astype(np.uint8).tolist()))
-    pad_len = (8 - len(bitstring) % 8) % 8
-    bitstring += "0" * pad_len
-    bytelist = [int(bitstring[i : i + 8], 2) for i in range(0, len(bitstring), 8)]
-    state_bytes = bytes(bytelist)
-    return hashlib.sha512(state_bytes).digest()
+    return hashlib.sha512(np.packbits(bits)).digest()
+
+
+def state_to_bytes(bits: np.ndarray) -> bytes:
+    """
+    Serialize a CA state as hashed by derive_key: one bit per cell, first cell in
+    the most significant bit, the last byte zero-padded.
+    """
+    assert isinstance(bits, np.ndarray) and bits.ndim == 1
+    return np.packbits(bits).tobytes()
 
 
 def xor_blocks(*blocks: bytes) -> bytes:
@@ -199,5 +367,10 @@ def prepare_secrets(*secrets: bytes | str) -> list[bytes]:
 
 def bit_entropy(state: np.ndarray) -> float:
     """Shannon entropy of a CA state."""
-    p = np.mean(state)
+    return _p_entropy(np.mean(state))
+
+
+def _p_entropy(p: float) -> float:
+    """Binary Shannon entropy for a fraction p of live cells."""
+    p = np.float64(p)
     return 0.0 if p in [0, 1] else -p * np.log2(p) - (1 - p) * np.log2(1 - p)
@@ -0,0 +1,131 @@
+"""
+An optional in-process cache around derive_key, for services that re-derive the
+same keys (e.g. on retries).
+"""
+
+import hashlib
+import secrets as _secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, NamedTuple
+
+from .ca import derive_key
+
+
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    evictions: int  # dropped because the cache was full
+    expirations: int  # dropped because their TTL had passed
+    maxsize: int
+    currsize: int
+
+
+class KeyCache:
+    """
+    LRU cache of derived keys with at most `maxsize` entries, each valid for `ttl`
+    seconds after it was derived (None: no expiry).
+
+    Entries are indexed by a BLAKE2b digest of the inputs, keyed with a random
+    per-cache key, so neither the secrets nor a cheap-to-brute-force hash of them is
+    kept. Cached keys are held in bytearrays that are overwritten with zeros when
+    they are evicted, expire or are cleared; the bytes returned to callers are
+    copies and are not zeroized.
+    """
+
+    def __init__(
+        self,
+        maxsize=1024,
+        ttl: float | None = 300.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        assert maxsize >= 1, "Maxsize must be a positive int."
+        assert ttl is None or ttl > 0, "TTL must be positive or None."
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._index_key = _secrets.token_bytes(32)
+        self._entries: OrderedDict[bytes, tuple[bytearray, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = self._misses = self._evictions = self._expirations = 0
+
+    def derive_key(
+        self,
+        secrets: list[bytes],
+        salt: bytes,
+        counter: int,
+        size=1024,
+        engine="packed",
+    ) -> bytes:
+        """derive_key, answered from the cache if the same inputs were derived before."""
+        index = self._index(secrets, salt, counter, size)
+        with self._lock:
+            entry = self._entries.get(index)
+            if entry is not None and self._expired(entry):
+                self._drop(index)
+                self._expirations += 1
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(index)
+                self._hits += 1
+                return bytes(entry[0])
+            self._misses += 1
+
+        key = derive_key(secrets, salt, counter, size=size, engine=engine)
+        expires = float("inf") if self.ttl is None else self._clock() + self.ttl
+        with self._lock:
+            if index in self._entries:
+                self._drop(index)
+            self._entries[index] = (bytearray(key), expires)
+            while len(self._entries) > self.maxsize:
+                self._drop(next(iter(self._entries)))
+                self._evictions += 1
+        return key
+
+    def purge(self) -> int:
+        """Drop all expired entries now instead of on their next lookup."""
+        with self._lock:
+            expired = [i for i, entry in self._entries.items() if self._expired(entry)]
+            for index in expired:
+                self._drop(index)
+            self._expirations += len(expired)
+        return len(expired)
+
+    def clear(self) -> None:
+        """Drop (and zeroize) every entry; the statistics are kept."""
+        with self._lock:
+            while self._entries:
+                self._drop(next(iter(self._entries)))
+
+    def cache_info(self) -> CacheInfo:
+        with self._lock:
+            return CacheInfo(
+                self._hits,
+                self._misses,
+                self._evictions,
+                self._expirations,
+                self.maxsize,
+                len(self._entries),
+            )
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _index(
+        self, secrets: list[bytes], salt: bytes, counter: int, size: int
+    ) -> bytes:
+        h = hashlib.blake2b(key=self._index_key, digest_size=32)
+        for block in (*secrets, salt):
+            h.update(len(block).to_bytes(8, "big"))
+            h.update(block)
+        h.update(counter.to_bytes(8, "big"))
+        h.update(size.to_bytes(8, "big"))
+        return h.digest()
+
+    def _expired(self, entry: tuple[bytearray, float]) -> bool:
+        return entry[1] <= self._clock()
+
+    def _drop(self, index: bytes) -> None:
+        key, _ = self._entries.pop(index)
+        key[:] = bytes(len(key))
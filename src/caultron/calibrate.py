@@ -0,0 +1,97 @@
+"""
+Pick the universe size that makes derive_key take a target time on this machine.
+
+A derivation costs about (end - 1) steps of time t(size), where end is derived
+from the seed (see get_mid_end). t is measured for growing sizes and fitted with
+a line, and the size is solved for both the median and the largest end.
+"""
+
+import hashlib
+import time
+from typing import NamedTuple
+
+import numpy as np
+
+from .ca import _derive_seed, derive_key, get_mid_end
+from .packed import WORD_BITS
+
+SALT = bytes(range(32))
+MAX_SIZE = 2**26
+
+
+class Calibration(NamedTuple):
+    target_s: float
+    median_steps: int
+    max_steps: int
+    measured: list[tuple[int, float]]  # (size, seconds per step)
+    median_size: int  # size whose median derivation takes target_s
+    worst_size: int  # size whose slowest derivation takes target_s
+
+
+def step_distribution() -> np.ndarray:
+    """Steps (end - 1) of a derivation for every value of the seed's last two bytes."""
+    return np.array([
+        get_mid_end(bytes(30) + bytes([b, a]))[1] - 1
+        for a in range(256)
+        for b in range(256)
+    ])
+
+
+def seconds_per_step(size: int, counters=8, engine="packed") -> float:
+    """Average time per evolution step of derive_key with `counters` fixed inputs."""
+    secrets = [hashlib.sha256(b"calibrate").digest()]
+    derive_key(secrets, SALT, 0, size=size, engine=engine)  # compile / load caches
+    steps = 0
+    start = time.perf_counter()
+    for counter in range(1, counters + 1):
+        steps += get_mid_end(_derive_seed(secrets, SALT, counter))[1] - 1
+        derive_key(secrets, SALT, counter, size=size, engine=engine)
+    return (time.perf_counter() - start) / steps
+
+
+def calibrate(target_ms: float, counters=8, engine="packed") -> Calibration:
+    """
+    Measure sizes from 1024 upwards (x4) until the slowest derivation exceeds the
+    target, and solve the fitted step time for the sizes meeting the target.
+    """
+    assert target_ms > 0, "Target must be positive."
+    target_s = target_ms / 1000
+    steps = step_distribution()
+    median_steps, max_steps = int(np.median(steps)), int(steps.max())
+
+    measured = []
+    size = 1024
+    while True:
+        measured.append((size, seconds_per_step(size, counters, engine)))
+        if measured[-1][1] * max_steps >= target_s or size >= MAX_SIZE:
+            break
+        size *= 4
+    sizes, step_s = np.array(measured[-3:]).T
+    slope, intercept = (
+        np.polyfit(sizes, step_s, 1) if len(measured) > 1 else (step_s[0] / sizes[0], 0)
+    )
+
+    def size_for(n_steps: int) -> int:
+        size = (target_s / n_steps - intercept) / max(slope, 1e-18)
+        return max(WORD_BITS, int(size) // WORD_BITS * WORD_BITS)
+
+    return Calibration(
+        target_s,
+        median_steps,
+        max_steps,
+        measured,
+        size_for(median_steps),
+        size_for(max_steps),
+    )
+
+
+def latencies(size: int, counters=16, engine="packed") -> np.ndarray:
+    """Measured derive_key times in seconds for `counters` fixed inputs."""
+    secrets = [hashlib.sha256(b"calibrate check").digest()]
+    derive_key(secrets, SALT, 0, size=size, engine=engine)
+    times = []
+    for counter in range(1, counters + 1):
+        start = time.perf_counter()
+        derive_key(secrets, SALT, counter, size=size, engine=engine)
+        times.append(time.perf_counter() - start)
+    return np.array(times)
@@ -1,6 +1,8 @@
-from itertools import islice
 from struct import pack, unpack
-from typing import Generator
+from typing import Generator, Sequence
+
+import numpy as np
+from numba import njit, prange
 
 SIGMA = (0x61707865, 0x3320646E, 0x79622D32, 0x6B206574)
 
@@ -58,6 +60,133 @@ def yield_chacha20_xor_stream(
             )
 
 
+@njit(cache=True)
+def _quarter_round(x, a, b, c, d):
+    # Same rotation as yield_chacha20_xor_stream: ((v >> c) | (v << (32 - c))).
+    # Stores into the uint32 array truncate to 32 bits.
+    x[a] = x[a] + x[b]
+    v = x[d] ^ x[a]
+    x[d] = (v >> 16) | (v << 16)
+    x[c] = x[c] + x[d]
+    v = x[b] ^ x[c]
+    x[b] = (v >> 12) | (v << 20)
+    x[a] = x[a] + x[b]
+    v = x[d] ^ x[a]
+    x[d] = (v >> 8) | (v << 24)
+    x[c] = x[c] + x[d]
+    v = x[b] ^ x[c]
+    x[b] = (v >> 7) | (v << 25)
+
+
+@njit(cache=True, nogil=True)
+def _chacha20_blocks(ctx, n_blocks):
+    """Compute n_blocks consecutive keystream blocks as a (n_blocks, 16) uint32 array."""
+    out = np.empty((n_blocks, 16), dtype=np.uint32)
+    _chacha20_blocks_into(ctx, out)
+    return out
+
+
+@njit(cache=True, parallel=True)
+def _chacha20_blocks_multi(ctxs, n_blocks):
+    """Keystream blocks for each row of ctxs, as a (rows, n_blocks, 16) uint32 array."""
+    out = np.empty((len(ctxs), n_blocks, 16), dtype=np.uint32)
+    for r in prange(len(ctxs)):
+        _chacha20_blocks_into(ctxs[r], out[r])
+    return out
+
+
+@njit(cache=True)
+def _chacha20_blocks_into(ctx, out):
+    state = ctx.copy()
+    x = np.empty(16, dtype=np.uint32)
+    for blk in range(len(out)):
+        _chacha20_block(state, x)
+        out[blk] = x
+        state[12] += 1
+
+
+@njit(cache=True)
+def _chacha20_block(state, x):
+    """Compute the keystream block of `state` into the 16-word array x."""
+    x[:] = state
+    for _ in range(10):
+        _quarter_round(x, 0, 4, 8, 12)
+        _quarter_round(x, 1, 5, 9, 13)
+        _quarter_round(x, 2, 6, 10, 14)
+        _quarter_round(x, 3, 7, 11, 15)
+        _quarter_round(x, 0, 5, 10, 15)
+        _quarter_round(x, 1, 6, 11, 12)
+        _quarter_round(x, 2, 7, 8, 13)
+        _quarter_round(x, 3, 4, 9, 14)
+    for i in range(16):
+        x[i] += state[i]
+
+
+def chacha20_keystream(
+    length: int, key: bytes, iv: bytes | None = None, position: int = 0
+) -> np.ndarray:
+    """
+    Compute `length` bytes of the ChaCha20 keystream in one compiled pass.
+    Returns a contiguous uint8 array, byte-identical to yield_chacha20_xor_stream.
+    """
+    if iv is None:
+        iv = b"\0" * 12
+    ctx = _chacha20_ctx(length, key, iv, position)
+    blocks = _chacha20_blocks(ctx, -(-length // 64))
+    # The keystream is serialized little-endian, like pack("<16L", ...).
+    return blocks.astype("<u4", copy=False).view(np.uint8).reshape(-1)[:length]
+
+
+def chacha20_keystreams(
+    length: int, keys: Sequence[bytes], ivs: Sequence[bytes], position: int = 0
+) -> np.ndarray:
+    """
+    Compute `length` keystream bytes for every (key, iv) pair in one parallel pass.
+    Returns a (len(keys), length) uint8 array whose rows equal chacha20_keystream.
+    """
+    ctxs = _chacha20_ctxs(length, keys, ivs, position)
+    blocks = _chacha20_blocks_multi(ctxs, -(-length // 64))
+    return (
+        blocks
+        .astype("<u4", copy=False)
+        .view(np.uint8)
+        .reshape(len(keys), -1)[:, :length]
+    )
+
+
+def _chacha20_ctx(length: int, key: bytes, iv: bytes, position: int) -> np.ndarray:
+    """Validate the parameters and build the initial 16-word ChaCha20 state."""
+    return _chacha20_ctxs(length, [key], [iv], position)[0]
+
+
+def _chacha20_ctxs(
+    length: int, keys: Sequence[bytes], ivs: Sequence[bytes], position: int
+) -> np.ndarray:
+    """Validate the parameters and build one initial state per (key, iv) pair."""
+    assert len(keys) == len(ivs), "Keys and IVs must pair up."
+    assert isinstance(length, int) and length >= 0, "Length must be a non-negative int."
+    assert all(isinstance(key, bytes) for key in keys), "Key must be bytes."
+    assert all(len(key) == 32 for key in keys), "Key must be 32 bytes."
+    assert all(isinstance(iv, bytes) for iv in ivs), "IV/nonce must be bytes."
+    assert all(len(iv) == 12 for iv in ivs), (
+        "Nonce/IV must be 12 bytes (96 bits) for ChaCha20."
+    )
+    assert isinstance(position, int), "Position/counter must be an integer."
+    assert 0 <= position < 2**32, (
+        "Position/counter must be a uint32 (0 <= position < 2**32)."
+    )
+    if position + -(-length // 64) > 2**32:
+        raise RuntimeError(
+            "ChaCha20 block counter overflow: keystream reuse would occur. Limit output to < 2^32 blocks per IV."
+        )
+    ctxs = np.empty((len(keys), 16), dtype=np.uint32)
+    ctxs[:, :4] = SIGMA
+    ctxs[:, 4:12] = np.frombuffer(b"".join(keys), dtype="<u4").reshape(-1, 8)
+    ctxs[:, 12] = position
+    ctxs[:, 13:16] = np.frombuffer(b"".join(ivs), dtype=">u4").reshape(-1, 3)
+    return ctxs
+
+
 def chacha20_encrypt(
     data: bytes, key: bytes, iv: bytes | None = None, position: int = 0
 ) -> bytes:
@@ -76,5 +205,5 @@ def chacha20_encrypt(
         "Position/counter must be a uint32 (0 <= position < 2**32)."
     )
 
-    keystream = islice(yield_chacha20_xor_stream(key, iv, position), len(data))
-    return bytes(a ^ b for a, b in zip(data, keystream))
+    keystream = chacha20_keystream(len(data), key, iv, position)
+    return (np.frombuffer(data, dtype=np.uint8) ^ keystream).tobytes()
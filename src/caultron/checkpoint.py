@@ -0,0 +1,253 @@
+"""
+Checkpoint and resume of a key derivation.
+
+A Checkpoint holds everything the packed derive_key loop needs to carry on after
+a given step: the packed cells, the current meta_rule, the live cell count and
+the midpoint hash once it has been taken. Resuming from a checkpoint derives
+exactly the same key as an uninterrupted derive_key call.
+
+Checkpoint files are a fixed 128-byte header followed by the packed words
+(little-endian uint64). They contain the CA state and must be protected like
+the key itself. The header identifies the secrets by a hash of the state after
+the first CHECK_STEPS steps, so testing a password guess against it costs an
+evolution, not a single hash.
+"""
+
+import hashlib
+import os
+import struct
+from typing import NamedTuple
+
+import numpy as np
+
+from .ca import (
+    _derive_seed,
+    _dual_point_key,
+    _end_nonce,
+    _packed_point,
+    _packed_steps,
+    get_mid_end,
+)
+from .packed import n_words, packed_state_bytes
+from .rules import rule_schedule
+
+MAGIC = b"CAULCKPT"
+VERSION = 1
+# magic, version, size, counter, step, end, rule_bits, live, has_midpoint,
+# midpoint, seed_check
+HEADER = struct.Struct("<8sIQQIIQQB64s8s")
+HEADER_SIZE = 128
+CHECK_STEPS = 16  # evolution steps behind the seed check
+
+
+class Checkpoint(NamedTuple):
+    counter: int
+    size: int
+    step: int  # steps completed; the derivation continues with step + 1
+    end: int
+    rule_bits: int  # current meta_rule
+    live: int
+    midpoint: bytes  # b"" until the midpoint step
+    words: np.ndarray
+    seed_check: bytes  # identifies the derivation without revealing the seed
+
+    @property
+    def done(self) -> bool:
+        """Whether all steps are completed and only the endpoint hash is left."""
+        return self.step >= self.end - 1
+
+
+def new_checkpoint(
+    secrets: list[bytes], salt: bytes, counter: int, size=1024
+) -> Checkpoint:
+    """The state of a derivation before its first step."""
+    seed = _derive_seed(secrets, salt, counter)
+    _, end = get_mid_end(seed)
+    return Checkpoint(
+        counter,
+        size,
+        0,
+        end,
+        int.from_bytes(seed[:4], "big"),
+        0,
+        b"",
+        np.zeros(n_words(size), dtype=np.uint64),
+        _seed_check(seed, counter, size),
+    )
+
+
+def advance(
+    secrets: list[bytes], salt: bytes, checkpoint: Checkpoint, steps: int | None = None
+) -> Checkpoint:
+    """
+    Run at most `steps` further steps (all remaining ones by default) and return
+    the new checkpoint. The given checkpoint is left unchanged.
+    """
+    assert steps is None or steps >= 0, "Steps must be a non-negative int."
+    return _advance(_checked_seed(secrets, salt, checkpoint), checkpoint, steps)
+
+
+def finish(secrets: list[bytes], salt: bytes, checkpoint: Checkpoint) -> bytes:
+    """Run any remaining steps and derive the key, as derive_key would."""
+    return _finish(_checked_seed(secrets, salt, checkpoint), checkpoint)
+
+
+def derive_key_resumable(
+    secrets: list[bytes],
+    salt: bytes,
+    counter: int,
+    path: str | os.PathLike,
+    size=1024,
+    every=32,
+) -> bytes:
+    """
+    derive_key that saves a checkpoint to `path` every `every` steps and resumes
+    from `path` if it already holds one. The file is removed once the key is derived.
+    """
+    assert every >= 1, "Every must be a positive int."
+    if os.path.exists(path):
+        checkpoint = load_checkpoint(path)
+        assert (checkpoint.counter, checkpoint.size) == (counter, size), (
+            f"{path} holds a checkpoint of another derivation."
+        )
+        seed = _checked_seed(secrets, salt, checkpoint)
+    else:
+        checkpoint = new_checkpoint(secrets, salt, counter, size)
+        seed = _derive_seed(secrets, salt, counter)
+    # the seed is checked once; the check costs CHECK_STEPS steps
+    while not checkpoint.done:
+        checkpoint = _advance(seed, checkpoint, every)
+        save_checkpoint(path, checkpoint)
+    key = _finish(seed, checkpoint)
+    os.remove(path)
+    return key
+
+
+def save_checkpoint(path: str | os.PathLike, checkpoint: Checkpoint) -> None:
+    """Write a checkpoint file atomically: `path` holds either the old or the new one."""
+    header = HEADER.pack(
+        MAGIC,
+        VERSION,
+        checkpoint.size,
+        checkpoint.counter,
+        checkpoint.step,
+        checkpoint.end,
+        checkpoint.rule_bits,
+        checkpoint.live,
+        bool(checkpoint.midpoint),
+        checkpoint.midpoint,
+        checkpoint.seed_check,
+    )
+    tmp = f"{os.fspath(path)}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(header.ljust(HEADER_SIZE, b"\0"))
+        f.write(checkpoint.words.astype("<u8", copy=False).tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def load_checkpoint(path: str | os.PathLike) -> Checkpoint:
+    """Read a checkpoint file written by save_checkpoint."""
+    with open(path, "rb") as f:
+        data = f.read()
+    if len(data) < HEADER_SIZE:
+        raise ValueError(f"{path} is not a CAultron checkpoint (version {VERSION}).")
+    (
+        magic,
+        version,
+        size,
+        counter,
+        step,
+        end,
+        rule_bits,
+        live,
+        has_midpoint,
+        midpoint,
+        seed_check,
+    ) = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{path} is not a CAultron checkpoint (version {VERSION}).")
+    if len(data) != HEADER_SIZE + 8 * n_words(size):
+        raise ValueError(f"{path} is truncated.")
+    words = np.frombuffer(data, dtype="<u8", offset=HEADER_SIZE).astype(np.uint64)
+    return Checkpoint(
+        counter,
+        size,
+        step,
+        end,
+        rule_bits,
+        live,
+        midpoint if has_midpoint else b"",
+        words,
+        seed_check,
+    )
+
+
+def _advance(seed: bytes, checkpoint: Checkpoint, steps: int | None) -> Checkpoint:
+    """advance with the seed already checked against the checkpoint."""
+    mid, end = get_mid_end(seed)
+    stop = end if steps is None else min(end, checkpoint.step + 1 + steps)
+    schedule = rule_schedule(int.from_bytes(seed[:4], "big"))
+    # Every index holding this meta_rule leads to the same rotations from here on.
+    k = int(np.flatnonzero(schedule.bits == checkpoint.rule_bits)[0])
+    words, live, k, midpoint = _packed_steps(
+        seed,
+        checkpoint.counter,
+        checkpoint.size,
+        mid,
+        checkpoint.words.copy(),
+        checkpoint.live,
+        k,
+        checkpoint.midpoint,
+        checkpoint.step + 1,
+        stop,
+    )
+    return checkpoint._replace(
+        step=max(checkpoint.step, stop - 1),
+        rule_bits=int(schedule.bits[k]),
+        live=live,
+        midpoint=midpoint,
+        words=words,
+    )
+
+
+def _finish(seed: bytes, checkpoint: Checkpoint) -> bytes:
+    """finish with the seed already checked against the checkpoint."""
+    if not checkpoint.done:
+        checkpoint = _advance(seed, checkpoint, None)
+    _, _, endpoint = _packed_point(
+        checkpoint.words.copy(),
+        checkpoint.live,
+        checkpoint.size,
+        seed,
+        _end_nonce(checkpoint.counter),
+    )
+    return _dual_point_key(checkpoint.midpoint, endpoint)
+
+
+def _seed_check(seed: bytes, counter: int, size: int) -> bytes:
+    """A hash of the state after step CHECK_STEPS (or the last step, if earlier)."""
+    mid, end = get_mid_end(seed)
+    words, _, _, _ = _packed_steps(
+        seed,
+        counter,
+        size,
+        mid,
+        np.zeros(n_words(size), dtype=np.uint64),
+        0,
+        0,
+        b"",
+        1,
+        min(end, CHECK_STEPS + 1),
+    )
+    return hashlib.sha256(
+        b"caultron checkpoint" + packed_state_bytes(words, size).tobytes()
+    ).digest()[:8]
+
+
+def _checked_seed(secrets: list[bytes], salt: bytes, checkpoint: Checkpoint) -> bytes:
+    seed = _derive_seed(secrets, salt, checkpoint.counter)
+    if _seed_check(seed, checkpoint.counter, checkpoint.size) != checkpoint.seed_check:
+        raise ValueError("The checkpoint belongs to other secrets or another salt.")
+    return seed
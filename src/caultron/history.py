@@ -0,0 +1,92 @@
+"""
+Evolution histories that do not have to fit in memory.
+
+Rows are stored bit-packed like state_to_bytes: one bit per cell, first cell in
+the most significant bit, (size + 7) // 8 bytes per row. History files are a
+fixed 64-byte header followed by the raw rows, so they can be memory-mapped.
+"""
+
+import os
+import struct
+from typing import Generator, NamedTuple
+
+import numpy as np
+
+from .packed import evolve_packed, inject_seed_packed, n_words, packed_state_bytes
+
+MAGIC = b"CAULHIST"
+VERSION = 1
+HEADER = struct.Struct("<8sIQQ32s")  # magic, version, size, steps, seed
+HEADER_SIZE = 64
+
+
+class HistoryHeader(NamedTuple):
+    seed: bytes
+    size: int
+    steps: int
+
+
+def row_bytes(size: int) -> int:
+    """Bytes per bit-packed row of a universe of `size` cells."""
+    return (size + 7) // 8
+
+
+def iter_ca(
+    seed: bytes, steps=100, size=1024, packed=False
+) -> Generator[np.ndarray, None, None]:
+    """
+    Lazily yield the states of run_ca one step at a time.
+    Rows are bool arrays, or bit-packed uint8 rows if `packed` is set.
+    """
+    assert isinstance(seed, bytes) and len(seed) == 32, "Seed must be 32 bytes."
+    words = np.zeros(n_words(size), dtype=np.uint64)
+    for x in range(steps):
+        words = inject_seed_packed(
+            words, size, seed, nonce=f"bits={x:<12}".encode()[:12]
+        )
+        words = evolve_packed(words, size, seed)
+        row = packed_state_bytes(words, size)
+        yield row if packed else unpack_rows(row, size)
+
+
+def unpack_rows(rows: np.ndarray, size: int) -> np.ndarray:
+    """Unpack bit-packed rows (one row or a 2D block of rows) into bool cells."""
+    return np.unpackbits(rows, axis=-1, count=size).astype(bool)
+
+
+def create_history(
+    path: str | os.PathLike, seed: bytes, steps: int, size: int
+) -> np.memmap:
+    """
+    Create a history file for `steps` rows of `size` cells and return its rows
+    as a writable (steps, row_bytes(size)) uint8 memmap.
+    """
+    assert isinstance(seed, bytes) and len(seed) == 32, "Seed must be 32 bytes."
+    with open(path, "wb") as f:
+        f.write(
+            HEADER.pack(MAGIC, VERSION, size, steps, seed).ljust(HEADER_SIZE, b"\0")
+        )
+        f.truncate(HEADER_SIZE + steps * row_bytes(size))
+    return np.memmap(
+        path,
+        dtype=np.uint8,
+        mode="r+",
+        offset=HEADER_SIZE,
+        shape=(steps, row_bytes(size)),
+    )
+
+
+def open_history(path: str | os.PathLike, mode="r") -> tuple[HistoryHeader, np.memmap]:
+    """Open a history file; returns its header and its rows as a memmap."""
+    with open(path, "rb") as f:
+        magic, version, size, steps, seed = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{path} is not a CAultron history file (version {VERSION}).")
+    rows = np.memmap(
+        path,
+        dtype=np.uint8,
+        mode=mode,
+        offset=HEADER_SIZE,
+        shape=(steps, row_bytes(size)),
+    )
+    return HistoryHeader(seed, size, steps), rows
@@ -0,0 +1,193 @@
+"""
+Headless statistics of derived keys over large counter ranges.
+
+Keys are derived in parallel (see derive_keys) and folded into running
+statistics one at a time, so memory does not grow with the number of counters.
+Run with `python -m caultron.keystats`; plots are written to files, never shown.
+"""
+
+import argparse
+import json
+import os
+from typing import Iterable
+
+import numpy as np
+
+from .batch import derive_keys, parse_salt
+from .ca import prepare_secrets
+
+KEY_BITS = 512
+
+
+class KeyStatistics:
+    """
+    Running statistics of a sequence of keys of equal length:
+
+    - weights: histogram of the Hamming weight of each key
+    - distances: histogram of the Hamming distance between consecutive keys
+    - ones: per bit position, how many keys have the bit set
+    - flips: per bit position, how often the bit differs between consecutive keys
+
+    For ideal keys, weights and distances follow Binomial(bits, 1/2), and each bit
+    is set (and flips between consecutive keys) with probability 1/2.
+    """
+
+    def __init__(self, bits=KEY_BITS):
+        self.bits = bits
+        self.count = 0
+        self.weights = np.zeros(bits + 1, dtype=np.int64)
+        self.distances = np.zeros(bits + 1, dtype=np.int64)
+        self.ones = np.zeros(bits, dtype=np.int64)
+        self.flips = np.zeros(bits, dtype=np.int64)
+        self._previous = None
+
+    def add(self, key: bytes) -> None:
+        key_bits = np.unpackbits(np.frombuffer(key, dtype=np.uint8))
+        assert len(key_bits) == self.bits, f"Keys must be {self.bits} bits."
+        self.count += 1
+        self.weights[key_bits.sum()] += 1
+        self.ones += key_bits
+        if self._previous is not None:
+            flipped = key_bits ^ self._previous
+            self.distances[flipped.sum()] += 1
+            self.flips += flipped
+        self._previous = key_bits
+
+    def summary(self) -> dict[str, float]:
+        """Means, spreads and the largest deviations from ideal keys."""
+        pairs = max(self.count - 1, 1)
+        values = np.arange(self.bits + 1)
+        half = self.bits / 2
+
+        def mean_std(hist):
+            n = max(hist.sum(), 1)
+            mean = (hist * values).sum() / n
+            return mean, np.sqrt((hist * (values - mean) ** 2).sum() / n)
+
+        weight_mean, weight_std = mean_std(self.weights)
+        distance_mean, distance_std = mean_std(self.distances)
+        bias = self.ones / max(self.count, 1) - 0.5
+        flip_rate = self.flips / pairs
+        return {
+            "keys": self.count,
+            "weight_mean": float(weight_mean),
+            "weight_std": float(weight_std),
+            "distance_mean": float(distance_mean),
+            "distance_std": float(distance_std),
+            "ideal_mean": half,
+            "ideal_std": float(np.sqrt(self.bits) / 2),
+            "max_bit_bias": float(np.abs(bias).max()),
+            # largest deviation of a bit's one-count, in standard deviations
+            "max_bit_bias_z": float(
+                np.abs(bias).max() * 2 * np.sqrt(max(self.count, 1))
+            ),
+            "min_flip_rate": float(flip_rate.min()),
+            "max_flip_rate": float(flip_rate.max()),
+        }
+
+    def save_plots(self, directory: str | os.PathLike) -> list[str]:
+        """Render the histograms and per-bit rates as PNG files in `directory`."""
+        try:
+            from matplotlib.figure import Figure
+        except ImportError as e:
+            raise ImportError(
+                "Plotting requires matplotlib: pip install caultron[plot]"
+            ) from e
+        os.makedirs(directory, exist_ok=True)
+        bits = np.arange(self.bits)
+        plots = {
+            "weights.png": ("Hamming weight of keys", "Weight", self.weights, None),
+            "distances.png": (
+                "Hamming distance between consecutive counters",
+                "Distance",
+                self.distances,
+                None,
+            ),
+            "bit_bias.png": (
+                "Fraction of keys with the bit set",
+                "Bit position",
+                self.ones / max(self.count, 1),
+                bits,
+            ),
+            "bit_flips.png": (
+                "Flip rate between consecutive counters",
+                "Bit position",
+                self.flips / max(self.count - 1, 1),
+                bits,
+            ),
+        }
+        paths = []
+        for name, (title, xlabel, values, x) in plots.items():
+            fig = Figure(figsize=(10, 4), tight_layout=True)
+            ax = fig.subplots()
+            if x is None:
+                ax.bar(np.arange(len(values)), values, width=1.0)
+                ax.set_ylabel("Keys")
+            else:
+                ax.plot(x, values, linewidth=0.8)
+                ax.axhline(0.5, color="gray", linestyle="--")
+            ax.set_title(title)
+            ax.set_xlabel(xlabel)
+            ax.grid(True)
+            path = os.path.join(directory, name)
+            fig.savefig(path)
+            paths.append(path)
+        return paths
+
+
+def analyze_counters(
+    secrets: list[bytes],
+    salt: bytes,
+    counters: Iterable[int],
+    size=1024,
+    workers: int | None = None,
+    chunksize: int = 16,
+) -> KeyStatistics:
+    """Derive the key of every counter, in parallel, into a KeyStatistics."""
+    stats = KeyStatistics()
+    for key in derive_keys(
+        secrets, salt, counters, size=size, workers=workers, chunksize=chunksize
+    ):
+        stats.add(key)
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m caultron.keystats",
+        description="Statistics of the keys derived for a range of counters.",
+    )
+    parser.add_argument(
+        "--password", type=str, required=True, help="Password or secret"
+    )
+    parser.add_argument("--salt", type=str, required=True, help="Salt (hex or string)")
+    parser.add_argument(
+        "--counters",
+        type=str,
+        default="1-1000",
+        help="Counter range FIRST-LAST (inclusive)",
+    )
+    parser.add_argument("--size", type=int, default=1024, help="Universe size")
+    parser.add_argument(
+        "--workers", type=int, default=0, help="Worker processes (0: one per CPU)"
+    )
+    parser.add_argument("--plots", metavar="DIR", help="Write PNG plots to DIR")
+    args = parser.parse_args(argv)
+    first, _, last = args.counters.partition("-")
+
+    stats = analyze_counters(
+        prepare_secrets(args.password),
+        parse_salt(args.salt),
+        range(int(first), int(last or first) + 1),
+        size=args.size,
+        workers=args.workers,
+    )
+    print(json.dumps(stats.summary(), indent=2))
+    if args.plots:
+        for path in stats.save_plots(args.plots):
+            print(f"Wrote {path}")
+    return stats
+
+
+if __name__ == "__main__":
+    main()
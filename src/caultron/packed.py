@@ -0,0 +1,406 @@
+"""
+Bit-packed universe representation: 64 cells per uint64 word.
+
+Cell i lives in word i // 64 at bit i % 64 (least significant bit first).
+Padding bits past the end of the universe are always kept at zero.
+"""
+
+import numpy as np
+from numba import get_num_threads, njit, prange, types
+from numba.extending import intrinsic
+
+from .chacha20 import _chacha20_block, _chacha20_ctxs, chacha20_keystream
+from .rules import Rule, _next_rule, _stagnates, compile_rule
+
+# Start numba's thread pool on the importing thread. With the TBB threading layer,
+# a pool first started by a worker thread (e.g. of an AsyncDeriver) hangs the
+# interpreter at exit once the main thread runs a parallel kernel too.
+get_num_threads()
+
+WORD_BITS = 64
+CHUNK_WORDS = 1024  # words per thread task in the parallel kernels
+# _REVERSED_BITS[b] is byte b with its bit order reversed
+_REVERSED_BITS = np.array([int(f"{b:08b}"[::-1], 2) for b in range(256)], np.uint8)
+
+
+def n_words(size: int) -> int:
+    """Number of uint64 words needed to hold `size` cells."""
+    return (size + WORD_BITS - 1) // WORD_BITS
+
+
+def pack_state(bits: np.ndarray) -> np.ndarray:
+    """
+    Pack a 1D array of cells (bool or 0/1 integers) into uint64 words.
+    """
+    assert isinstance(bits, np.ndarray) and bits.ndim == 1
+    packed = np.packbits(bits.astype(bool, copy=False), bitorder="little")
+    buf = np.zeros(n_words(len(bits)) * 8, dtype=np.uint8)
+    buf[: len(packed)] = packed
+    return buf.view("<u8").astype(np.uint64, copy=False)
+
+
+def unpack_state(words: np.ndarray, size: int) -> np.ndarray:
+    """
+    Unpack uint64 words into a bool array of `size` cells.
+    """
+    assert isinstance(words, np.ndarray) and len(words) == n_words(size)
+    buf = words.astype("<u8", copy=False).view(np.uint8)
+    return np.unpackbits(buf, count=size, bitorder="little").astype(bool)
+
+
+def packed_state_bytes(words: np.ndarray, size: int) -> np.ndarray:
+    """
+    The bytes of state_to_bytes(unpack_state(words, size)), built directly from the
+    words without unpacking. Returned as a uint8 array, usable wherever a buffer is
+    accepted (e.g. hashlib).
+    """
+    assert isinstance(words, np.ndarray) and len(words) == n_words(size)
+    lsb_first = words.astype("<u8", copy=False).view(np.uint8)[: (size + 7) // 8]
+    return _REVERSED_BITS[lsb_first]
+
+
+@njit(cache=True)
+def _window(words, size, p, count, boundary):
+    """
+    Read the `count` (<= 64) cells starting at cell index p as one word.
+    Cells outside [0, size) wrap around (boundary 0) or read as zero (boundary 1).
+    """
+    if p >= 0 and p + 64 <= size:
+        q = p >> 6
+        r = np.uint64(p & 63)
+        if r == 0:
+            return words[q]
+        return (words[q] >> r) | (words[q + 1] << (np.uint64(64) - r))
+    out = np.uint64(0)
+    for k in range(count):
+        idx = p + k
+        if boundary == 0:
+            idx = idx % size
+        elif idx < 0 or idx >= size:
+            continue
+        bit = (words[idx >> 6] >> np.uint64(idx & 63)) & np.uint64(1)
+        out |= bit << np.uint64(k)
+    return out
+
+
+@njit(cache=True)
+def _evolve_packed_numba(
+    words, size, rule_table, neighborhood_size, boundary, inversion
+):
+    out = np.empty_like(words)
+    _evolve_packed_into(
+        words, out, size, rule_table, neighborhood_size, boundary, inversion
+    )
+    return out
+
+
+@njit(cache=True)
+def _evolve_packed_into(
+    words, out, size, rule_table, neighborhood_size, boundary, inversion
+):
+    """
+    One evolution step on packed words, written into `out`.
+    Returns the number of live cells in the new state.
+    """
+    return _evolve_words(
+        words,
+        out,
+        size,
+        rule_table,
+        neighborhood_size,
+        boundary,
+        inversion,
+        0,
+        len(words),
+    )
+
+
+@njit(cache=True, nogil=True, parallel=True)
+def _evolve_packed_parallel_into(
+    words, out, size, rule_table, neighborhood_size, boundary, inversion
+):
+    """
+    _evolve_packed_into with the universe split into chunks of CHUNK_WORDS words
+    evolved by separate threads. A chunk reads the cells on either side of it (at
+    most 3 for neighborhood 6) from `words`, which no thread writes, so the halo
+    needs no copying and the result is identical to the serial step.
+    """
+    chunks = (len(words) + CHUNK_WORDS - 1) // CHUNK_WORDS
+    live = np.zeros(chunks, dtype=np.int64)
+    for c in prange(chunks):
+        live[c] = _evolve_words(
+            words,
+            out,
+            size,
+            rule_table,
+            neighborhood_size,
+            boundary,
+            inversion,
+            c * CHUNK_WORDS,
+            min(len(words), (c + 1) * CHUNK_WORDS),
+        )
+    return live.sum()
+
+
+@njit(cache=True)
+def _evolve_words(
+    words, out, size, rule_table, neighborhood_size, boundary, inversion, lo, hi
+):
+    """
+    Words lo..hi - 1 of an evolution step. Returns their number of live cells.
+
+    Each output word is computed for 64 cells at once: the neighbor words are
+    obtained by shifting, and the rule table is evaluated as a multiplexer tree
+    whose selectors are the neighbor words (rightmost neighbor = lowest index bit).
+    """
+    ones = ~np.uint64(0)
+    rule_table_size = 2**neighborhood_size
+    leaves = np.empty(rule_table_size, dtype=np.uint64)
+    for k in range(rule_table_size):
+        leaves[k] = ones if rule_table[k] else np.uint64(0)
+    inv = ones if inversion else np.uint64(0)
+    half = neighborhood_size // 2
+    neighbors = np.empty(neighborhood_size, dtype=np.uint64)
+    vals = np.empty(rule_table_size, dtype=np.uint64)
+    live = 0
+    for w in range(lo, hi):
+        base = w * 64
+        count = min(64, size - base)
+        for j in range(neighborhood_size):
+            neighbors[j] = _window(words, size, base + j - half, count, boundary)
+        vals[:] = leaves
+        width = rule_table_size
+        for level in range(neighborhood_size):
+            sel = neighbors[neighborhood_size - 1 - level]
+            width >>= 1
+            for m in range(width):
+                a = vals[2 * m]
+                vals[m] = a ^ ((a ^ vals[2 * m + 1]) & sel)
+        word = vals[0] ^ inv
+        if count < 64:
+            word &= (np.uint64(1) << np.uint64(count)) - np.uint64(1)
+        out[w] = word
+        live += _popcount64(word)
+    return live
+
+
+def evolve_packed(words: np.ndarray, size: int, seed: bytes) -> np.ndarray:
+    """Packed counterpart of `evolve`: one step under the rule in seed[:4]."""
+    assert isinstance(words, np.ndarray) and len(words) == n_words(size)
+    assert isinstance(seed, bytes) and len(seed) == 32, "Seed must be 32 bytes."
+    return _evolve_packed_rule(
+        words, size, compile_rule(int.from_bytes(seed[:4], "big"))
+    )
+
+
+def _evolve_packed_rule(words: np.ndarray, size: int, rule: Rule) -> np.ndarray:
+    return _evolve_packed_numba(
+        words, size, rule.table, rule.neighborhood_size, rule.boundary, rule.inversion
+    )
+
+
+@intrinsic
+def _ctpop64(typingctx, w):
+    """Hardware population count (LLVM ctpop) of a uint64."""
+    if w != types.uint64:
+        return None
+
+    def codegen(context, builder, signature, args):
+        return builder.ctpop(args[0])
+
+    return types.uint64(types.uint64), codegen
+
+
+@njit(cache=True)
+def _popcount64(w):
+    return int(_ctpop64(w))
+
+
+@njit(cache=True)
+def popcount(words):
+    """Number of live cells in a packed state."""
+    total = 0
+    for w in words:
+        total += _popcount64(w)
+    return total
+
+
+def inject_seed_packed(
+    words: np.ndarray, size: int, seed: bytes, nonce: bytes = b"\0" * 12
+) -> np.ndarray:
+    """
+    Packed counterpart of `inject_seed`: XOR the low bit of each ChaCha20 keystream
+    byte into the corresponding cell. Returns a new array of words.
+    """
+    assert isinstance(words, np.ndarray) and len(words) == n_words(size)
+    assert isinstance(seed, bytes) and len(seed) == 32, (
+        f"Seed must be 32 bytes, not {len(seed)}."
+    )
+    return words ^ pack_state(chacha20_keystream(size, seed, nonce) & 1)
+
+
+def injection_masks(
+    size: int, key: bytes, ivs: list[bytes], parallel=False
+) -> np.ndarray:
+    """
+    The injections of several steps at once, as a (len(ivs), n_words(size)) array
+    whose row r is pack_state(chacha20_keystream(size, key, ivs[r]) & 1). With
+    `parallel`, the blocks are generated by all of numba's threads.
+    """
+    ctxs = _chacha20_ctxs(size, [key] * len(ivs), ivs, 0)
+    if parallel:
+        return _injection_masks_parallel_numba(ctxs, size)
+    return _injection_masks_numba(ctxs, size)
+
+
+@njit(cache=True, nogil=True)
+def _injection_masks_numba(ctxs, size):
+    """Packed injection masks straight from the ChaCha20 blocks (see _mask_word)."""
+    nw = (size + 63) // 64
+    masks = np.empty((len(ctxs), nw), dtype=np.uint64)
+    x = np.empty(16, dtype=np.uint32)
+    for r in range(len(ctxs)):
+        for w in range(nw):
+            masks[r, w] = _mask_word(ctxs[r], w, size, x)
+    return masks
+
+
+@njit(cache=True, nogil=True, parallel=True)
+def _injection_masks_parallel_numba(ctxs, size):
+    """_injection_masks_numba with all blocks of all rows in parallel."""
+    nw = (size + 63) // 64
+    masks = np.empty((len(ctxs), nw), dtype=np.uint64)
+    for t in prange(len(ctxs) * nw):
+        r = t // nw
+        w = t - r * nw
+        masks[r, w] = _mask_word(ctxs[r], w, size, np.empty(16, dtype=np.uint32))
+    return masks
+
+
+@njit(cache=True, nogil=True)
+def _mask_word(ctx, w, size, x):
+    """
+    Mask word w of the keystream of `ctx`, using `x` as scratch. Block w holds the
+    keystream bytes of cells 64w..64w+63: the low bits of the four bytes of each
+    keystream word give four cells.
+    """
+    state = ctx.copy()
+    state[12] += np.uint32(w)
+    _chacha20_block(state, x)
+    word = np.uint64(0)
+    for i in range(16):
+        # gather bits 0, 8, 16 and 24 into bits 24..27 without carries
+        low_bits = np.uint64(x[i] & np.uint32(0x01010101))
+        nibble = (low_bits * np.uint64(0x01020408) >> np.uint64(24)) & np.uint64(0xF)
+        word |= nibble << np.uint64(4 * i)
+    count = size - w * 64
+    if count < 64:
+        word &= (np.uint64(1) << np.uint64(count)) - np.uint64(1)
+    return word
+
+
+@njit(cache=True, nogil=True)
+def _steps_masked_numba(words, spare, masks, size, k, tables, flags):
+    """
+    One fused derive_key step per row of `masks` (see injection_masks): XOR the
+    mask into the state, evolve under entry k of a RuleSchedule and move on to the
+    rotated rule on stagnation. The final state is left in `words` (`spare` is
+    scratch). Returns (live cells, schedule index for the next step).
+    """
+    a, b = words, spare
+    live = 0
+    for s in range(len(masks)):
+        prev = 0
+        for w in range(len(a)):
+            word = a[w] ^ masks[s, w]
+            a[w] = word
+            prev += _popcount64(word)
+        live = _evolve_packed_into(
+            a, b, size, tables[k], flags[k, 0], flags[k, 1], flags[k, 2]
+        )
+        if _stagnates(size, prev, live):
+            k = _next_rule(k)
+        a, b = b, a
+    if len(masks) % 2:
+        words[:] = a
+    return live, k
+
+
+@njit(cache=True, nogil=True, parallel=True)
+def _steps_masked_parallel_numba(words, spare, masks, size, k, tables, flags):
+    """
+    _steps_masked_numba for huge universes: the injection and the evolution of
+    every step are each split over threads (see _evolve_packed_parallel_into).
+    """
+    chunks = (len(words) + CHUNK_WORDS - 1) // CHUNK_WORDS
+    counts = np.zeros(chunks, dtype=np.int64)
+    a, b = words, spare
+    live = 0
+    for s in range(len(masks)):
+        for c in prange(chunks):
+            n = 0
+            for w in range(c * CHUNK_WORDS, min(len(a), (c + 1) * CHUNK_WORDS)):
+                word = a[w] ^ masks[s, w]
+                a[w] = word
+                n += _popcount64(word)
+            counts[c] = n
+        prev = counts.sum()
+        live = _evolve_packed_parallel_into(
+            a, b, size, tables[k], flags[k, 0], flags[k, 1], flags[k, 2]
+        )
+        if _stagnates(size, prev, live):
+            k = _next_rule(k)
+        a, b = b, a
+    if len(masks) % 2:
+        words[:] = a
+    return live, k
+
+
+@njit(cache=True)
+def _inject_packed_into(words, keystream, size):
+    """
+    XOR the low bit of each keystream byte into the cells of `words` (in place).
+    Returns the number of live cells afterwards.
+    """
+    live = 0
+    for w in range(len(words)):
+        base = w * 64
+        mask = np.uint64(0)
+        for j in range(min(64, size - base)):
+            mask |= np.uint64(keystream[base + j] & 1) << np.uint64(j)
+        word = words[w] ^ mask
+        words[w] = word
+        live += _popcount64(word)
+    return live
+
+
+@njit(cache=True, nogil=True)
+def _step_packed_numba(words, out, keystream, size, k, tables, flags):
+    """
+    One fused derive_key step on packed state.
+
+    XORs the low bit of each keystream byte into `words` (in place), evolves the
+    result into `out` under entry k of a RuleSchedule (`tables`, `flags`) and
+    moves on to the rotated rule if the entropy change is below ROTATION_THRESHOLD.
+    Returns (live cells in `out`, schedule index for the next step).
+    """
+    prev = _inject_packed_into(words, keystream, size)
+    live = _evolve_packed_into(
+        words, out, size, tables[k], flags[k, 0], flags[k, 1], flags[k, 2]
+    )
+    if _stagnates(size, prev, live):
+        k = _next_rule(k)
+    return live, k
+
+
+@njit(cache=True, parallel=True)
+def _step_lockstep_numba(words, out, keystreams, size, ks, tables, flags, live):
+    """
+    _step_packed_numba for every row of a 2D packed state, rows in parallel.
+    Row r uses keystreams[r] and the RuleSchedule (tables[r], flags[r]);
+    its schedule index ks[r] and live cell count live[r] are updated in place.
+    """
+    for r in prange(len(words)):
+        live[r], ks[r] = _step_packed_numba(
+            words[r], out[r], keystreams[r], size, ks[r], tables[r], flags[r]
+        )
@@ -0,0 +1,140 @@
+"""
+Streaming PNG rendering of CA evolutions of any length.
+
+States are consumed one at a time, from an evolution (iter_ca) or a history
+file, and aggregated into tiles of cells x steps: each pixel is the share of
+live cells in its tile (black: all live, white: all dead, as in visualize_ca).
+Only one pixel row is held at a time and PNG rows are compressed as they are
+produced, so memory does not grow with the number of steps. No display or
+matplotlib is needed.
+"""
+
+import os
+import struct
+import zlib
+from typing import Iterable, NamedTuple
+
+import numpy as np
+
+from .history import iter_ca, open_history, unpack_rows
+from .visualize import _entropy_of_counts
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+IDAT_SIZE = 1 << 16  # bytes of compressed data per IDAT chunk
+STRIP_GAP = 2  # white pixels between the cells and the entropy strip
+
+
+class Rendering(NamedTuple):
+    width: int  # in pixels
+    height: int
+    cells_per_pixel: int
+    steps_per_pixel: int
+
+
+def render_png(
+    states: Iterable[np.ndarray],
+    path: str | os.PathLike,
+    size: int,
+    steps: int,
+    width=1024,
+    height=1024,
+    entropy_width=0,
+    packed=False,
+) -> Rendering:
+    """
+    Render `steps` states of `size` cells into a PNG of at most width x height
+    pixels (plus the entropy strip), aggregating cells and steps into tiles.
+    States are bool rows, or bit-packed uint8 rows (see caultron.history) if
+    `packed` is set. With `entropy_width`, a strip of that many pixels on the
+    right shows the mean entropy of each pixel row's states as a bar, from 0 to
+    `size` bits (see visualize.calculate_entropy_per_state).
+    """
+    assert size >= 1 and steps >= 1, "Size and steps must be positive ints."
+    assert width >= 1 and height >= 1, "Width and height must be positive ints."
+    assert entropy_width >= 0, "Entropy width must be a non-negative int."
+    cx, cy = -(-size // width), -(-steps // height)
+    columns, rows = -(-size // cx), -(-steps // cy)
+    strip = entropy_width + STRIP_GAP if entropy_width else 0
+    # cells per column (the last one may hold fewer than cx)
+    cells = np.minimum(cx, size - cx * np.arange(columns))
+    padded = np.zeros(columns * cx, dtype=bool)
+    live = np.zeros(columns, dtype=np.int64)  # per column, over this pixel row
+    step_live = np.zeros(cy, dtype=np.int64)  # per step of this pixel row
+
+    with open(path, "wb") as f:
+        png = _PngWriter(f, columns + strip, rows)
+        step = 0
+        for state in states:
+            assert step < steps, f"More than {steps} states."
+            padded[:size] = unpack_rows(state, size) if packed else state
+            counts = padded.reshape(columns, cx).sum(axis=1)
+            live += counts
+            step_live[step % cy] = counts.sum()
+            step += 1
+            if step % cy == 0 or step == steps:
+                n = step - (step - 1) // cy * cy  # steps in this pixel row
+                row = 255 - live * 255 // (n * cells)
+                if strip:
+                    row = np.concatenate((row, _bar(step_live[:n], size, strip)))
+                png.write_row(row.astype(np.uint8))
+                live[:] = 0
+        assert step == steps, f"Only {step} of {steps} states."
+        png.finish()
+    return Rendering(columns + strip, rows, cx, cy)
+
+
+def render_history_png(
+    history: str | os.PathLike, path: str | os.PathLike, **kwargs
+) -> Rendering:
+    """render_png of all rows of a history file (see caultron.history)."""
+    header, rows = open_history(history)
+    return render_png(rows, path, header.size, header.steps, packed=True, **kwargs)
+
+
+def render_evolution_png(
+    seed: bytes, path: str | os.PathLike, steps=100, size=1024, **kwargs
+) -> Rendering:
+    """render_png of the evolution of run_ca, without storing its states."""
+    states = iter_ca(seed, steps, size, packed=True)
+    return render_png(states, path, size, steps, packed=True, **kwargs)
+
+
+def _bar(live: np.ndarray, size: int, strip: int) -> np.ndarray:
+    """The entropy strip of a pixel row: a gap, then a black bar on white."""
+    bits = _entropy_of_counts(live, size).mean()
+    bar = np.full(strip, 255, dtype=np.int64)
+    length = int(bits / size * (strip - STRIP_GAP) + 0.5)
+    bar[STRIP_GAP : STRIP_GAP + length] = 0
+    return bar
+
+
+class _PngWriter:
+    """An 8-bit grayscale PNG written row by row to a binary file."""
+
+    def __init__(self, file, width: int, height: int):
+        self.width, self.height, self.rows = width, height, 0
+        self._file = file
+        self._compressor = zlib.compressobj()
+        self._pending = b""
+        self._file.write(PNG_SIGNATURE)
+        # bit depth 8, color type 0 (grayscale), default compression/filter, no interlace
+        self._chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0))
+
+    def write_row(self, row: np.ndarray) -> None:
+        assert row.shape == (self.width,) and self.rows < self.height
+        self.rows += 1
+        # filter type 0 (None) before each row
+        self._pending += self._compressor.compress(b"\0" + row.tobytes())
+        if len(self._pending) >= IDAT_SIZE:
+            self._chunk(b"IDAT", self._pending)
+            self._pending = b""
+
+    def finish(self) -> None:
+        """Write the end of the image once all rows are written."""
+        assert self.rows == self.height, f"Only {self.rows} of {self.height} rows."
+        self._chunk(b"IDAT", self._pending + self._compressor.flush())
+        self._chunk(b"IEND", b"")
+
+    def _chunk(self, kind: bytes, data: bytes) -> None:
+        self._file.write(struct.pack(">I", len(data)) + kind + data)
+        self._file.write(struct.pack(">I", zlib.crc32(kind + data)))
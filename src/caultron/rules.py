@@ -0,0 +1,146 @@
+"""
+Compilation of 28-bit meta_rules (see spec 04) into ready-to-use rule tables.
+
+A meta_rule only changes when derive_key rotates it, so rules are decoded
+once and kept in bounded LRU caches instead of being rebuilt every step.
+"""
+
+from functools import lru_cache
+from typing import NamedTuple
+
+import numpy as np
+from numba import njit
+
+RULE_MASK = 0x0FFFFFFF  # 28 bits
+ROTATIONS = 28
+MAX_TABLE_SIZE = 2**6  # neighborhood size 6
+ROTATION_THRESHOLD = 0.1  # rotate when a step changes the entropy by less than this
+
+
+class Rule(NamedTuple):
+    """A decoded meta_rule together with its rule table."""
+
+    bits: int
+    core_rule: int
+    neighborhood_size: int
+    boundary: int
+    inversion: int
+    modulation: int
+    temporal: int
+    table: np.ndarray
+
+
+class RuleSchedule(NamedTuple):
+    """
+    Every rule a derivation can reach from one initial meta_rule.
+
+    Entry 0 is the initial rule and entry k + 1 its k-th rotation. Rotations of
+    a 28-bit rule cycle after 28 steps, so rotating entry ROTATIONS leads back to
+    entry 1 (see _next_rule). `tables` holds one rule table per row (padded to
+    MAX_TABLE_SIZE), `flags` the (neighborhood_size, boundary, inversion) per row.
+    """
+
+    bits: np.ndarray
+    tables: np.ndarray
+    flags: np.ndarray
+
+
+@njit(cache=True)
+def _rule_table(core_rule, neighborhood_size, modulation, temporal):
+    rule_table_size = 2**neighborhood_size
+    if neighborhood_size == 3:
+        rule_table = np.array(
+            [(core_rule >> i) & 1 for i in range(7, -1, -1)], dtype=np.uint8
+        )
+    else:
+        base = np.array(
+            [(core_rule >> (i % 8)) & 1 for i in range(rule_table_size - 1, -1, -1)],
+            dtype=np.uint8,
+        )
+        mask = np.array(
+            [(modulation >> (i % 8)) & 1 for i in range(rule_table_size - 1, -1, -1)],
+            dtype=np.uint8,
+        )
+        rule_table = base ^ mask
+    if temporal:
+        temporal_mod = temporal % rule_table_size
+        rule_table = np.concatenate((
+            rule_table[temporal_mod:],
+            rule_table[:temporal_mod],
+        ))
+    return rule_table
+
+
+@lru_cache(maxsize=256)
+def compile_rule(rule_bits: int) -> Rule:
+    """
+    Decode a meta_rule into its fields and rule table.
+    Only the low 28 bits are significant. Results are cached; treat them as read-only.
+    """
+    rule_bits &= RULE_MASK
+    core_rule = (rule_bits >> 20) & 0xFF  # bits 20-27
+    neighborhood_size = ((rule_bits >> 18) & 0x3) + 3  # bits 18-19, values 0-3 → 3-6
+    boundary = (rule_bits >> 17) & 0x1  # bit 17
+    inversion = (rule_bits >> 16) & 0x1  # bit 16
+    modulation = (rule_bits >> 8) & 0xFF  # bits 8-15
+    temporal = rule_bits & 0xFF  # bits 0-7
+    table = _rule_table(core_rule, neighborhood_size, modulation, temporal)
+    table.flags.writeable = False
+    return Rule(
+        rule_bits,
+        core_rule,
+        neighborhood_size,
+        boundary,
+        inversion,
+        modulation,
+        temporal,
+        table,
+    )
+
+
+@lru_cache(maxsize=64)
+def rule_schedule(rule_bits: int) -> RuleSchedule:
+    """Compile the initial meta_rule and all of its rotations."""
+    bits = np.empty(ROTATIONS + 1, dtype=np.int64)
+    tables = np.zeros((ROTATIONS + 1, MAX_TABLE_SIZE), dtype=np.uint8)
+    flags = np.empty((ROTATIONS + 1, 3), dtype=np.int64)
+    for k in range(ROTATIONS + 1):
+        rule = compile_rule(rule_bits)
+        bits[k] = rule_bits
+        tables[k, : len(rule.table)] = rule.table
+        flags[k] = rule.neighborhood_size, rule.boundary, rule.inversion
+        rule_bits = _rotate_rule(rule_bits)
+    for array in (bits, tables, flags):
+        array.flags.writeable = False
+    return RuleSchedule(bits, tables, flags)
+
+
+@njit(cache=True)
+def _rotate_rule(rule_bits):
+    """Rotate rule bits (meta_rule) by 1 bit to the left."""
+    return ((rule_bits << 1) | (rule_bits >> 27)) & 0x0FFFFFFF  # 28 bits
+
+
+@njit(cache=True)
+def _next_rule(k):
+    """Index in a RuleSchedule of the rotation of entry k."""
+    return k + 1 if k < ROTATIONS else 1
+
+
+@njit(cache=True)
+def _stagnates(size, prev, live):
+    """
+    Whether a step from `prev` to `live` live cells (of `size`) should rotate the
+    rule. The entropies are computed from the counts, as bit_entropy would.
+    """
+    change = _count_entropy(live, size) - _count_entropy(prev, size)
+    return abs(change) < ROTATION_THRESHOLD
+
+
+@njit(cache=True)
+def _count_entropy(live, size):
+    """Binary Shannon entropy of a state with `live` of `size` cells alive."""
+    if live == 0 or live == size:
+        return 0.0
+    p = live / size
+    return -p * np.log2(p) - (1 - p) * np.log2(1 - p)
@@ -0,0 +1,351 @@
+"""
+A local key derivation daemon with warm kernels, and its client.
+
+`python -m caultron serve` loads the kernels once and derives keys for clients
+connecting to a Unix domain socket, on an AsyncDeriver thread pool. Short-lived
+processes then skip numba's start-up cost on every derivation.
+
+Protocol: every message is a frame made of a 4-byte big-endian length and a
+UTF-8 JSON object of that length. Requests carry an "id", which the response
+repeats, and an "op":
+
+    {"id": 1, "op": "derive", "secrets": [hex, ...], "salt": hex, "counter": 1,
+     "size": 1024}  ->  {"id": 1, "key": hex}  or  {"id": 1, "error": "..."}
+    {"id": 2, "op": "stats"}  ->  {"id": 2, "stats": {...}}
+
+A connection may have many requests in flight; responses are sent as soon as
+they are ready, so they can arrive out of order. Requests carry secrets: the
+socket is only accessible to its owner, by default in a private directory, and
+clients only talk to a daemon run by their own user.
+"""
+
+import asyncio
+import json
+import os
+import signal
+import socket
+import struct
+import tempfile
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Iterable
+
+from .aio import AsyncDeriver
+from .ca import derive_key
+
+FRAME = struct.Struct(">I")
+MAX_FRAME = 1 << 20
+PEERCRED = struct.Struct("3i")  # struct ucred: pid, uid, gid
+
+
+def default_socket_path() -> str:
+    """
+    $CAULTRON_SOCKET, or caultron.sock in $XDG_RUNTIME_DIR, or else in a private
+    caultron-<uid> directory in the temp dir (created by serve).
+    """
+    if "CAULTRON_SOCKET" in os.environ:
+        return os.environ["CAULTRON_SOCKET"]
+    if os.environ.get("XDG_RUNTIME_DIR"):
+        return os.path.join(os.environ["XDG_RUNTIME_DIR"], "caultron.sock")
+    directory = os.path.join(tempfile.gettempdir(), f"caultron-{os.getuid()}")
+    return os.path.join(directory, "caultron.sock")
+
+
+@dataclass
+class ServerStats:
+    """Throughput and latency counters of a daemon."""
+
+    started: float = field(default_factory=time.monotonic)
+    connections: int = 0
+    requests: int = 0
+    keys: int = 0
+    errors: int = 0
+    in_flight: int = 0
+    latencies: deque = field(default_factory=lambda: deque(maxlen=1024))
+
+    def as_dict(self) -> dict:
+        uptime = time.monotonic() - self.started
+        recent = sorted(self.latencies)
+
+        def percentile(p):
+            return recent[min(len(recent) - 1, int(p * len(recent)))] * 1e3
+
+        return {
+            "uptime_s": uptime,
+            "connections": self.connections,
+            "requests": self.requests,
+            "keys": self.keys,
+            "errors": self.errors,
+            "in_flight": self.in_flight,
+            "keys_per_s": self.keys / uptime if uptime else 0.0,
+            # over the last (up to) 1024 derivations
+            "latency_p50_ms": percentile(0.5) if recent else None,
+            "latency_p99_ms": percentile(0.99) if recent else None,
+            "latency_max_ms": recent[-1] * 1e3 if recent else None,
+        }
+
+
+async def serve(
+    path: str | None = None,
+    max_workers: int | None = None,
+    max_pending: int | None = None,
+    ready: asyncio.Event | None = None,
+    stop: asyncio.Event | None = None,
+) -> None:
+    """
+    Run the daemon on the Unix socket `path` until `stop` is set (or forever).
+    `max_workers` and `max_pending` are passed to the AsyncDeriver. `ready` is set
+    once the socket accepts connections. Raises OSError if a daemon is already
+    listening on `path`; a stale socket file is replaced. The default directory is
+    created if needed and must be private (mode 0700, owned by this user).
+    """
+    if path is None:
+        path = default_socket_path()
+        _private_directory(os.path.dirname(path))
+    if os.path.exists(path):
+        if _is_listening(path):
+            raise OSError(f"A daemon is already listening on {path}.")
+        os.unlink(path)
+    stats = ServerStats()
+    async with AsyncDeriver(max_workers, max_pending) as deriver:
+        umask = os.umask(0o177)
+        try:
+            server = await asyncio.start_unix_server(
+                lambda reader, writer: _connection(reader, writer, deriver, stats),
+                path,
+            )
+        finally:
+            os.umask(umask)
+        try:
+            async with server:
+                if ready is not None:
+                    ready.set()
+                await (stop or asyncio.Event()).wait()
+        finally:
+            if os.path.exists(path):
+                os.unlink(path)
+
+
+def run(path: str | None = None, max_workers=None, max_pending=None) -> None:
+    """Warm the kernels up and run the daemon until SIGINT or SIGTERM."""
+    from .warmup import warm_up
+
+    warm_up()
+
+    async def main():
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, stop.set)
+        await serve(path, max_workers, max_pending, stop=stop)
+
+    asyncio.run(main())
+
+
+async def _connection(reader, writer, deriver: AsyncDeriver, stats: ServerStats):
+    stats.connections += 1
+    tasks = set()
+    try:
+        while (frame := await _read_frame(reader)) is not None:
+            task = asyncio.create_task(_respond(frame, writer, deriver, stats))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+    except (ConnectionError, ValueError):
+        pass
+    finally:
+        # a client that closed its side after sending still gets its responses
+        await asyncio.gather(*tasks, return_exceptions=True)
+        writer.close()
+
+
+async def _respond(frame: bytes, writer, deriver: AsyncDeriver, stats: ServerStats):
+    start = time.perf_counter()
+    stats.requests += 1
+    stats.in_flight += 1
+    request = {}
+    try:
+        request = json.loads(frame)
+        assert isinstance(request, dict), "A request must be a JSON object."
+        if request.get("op") == "stats":
+            response = {"stats": stats.as_dict()}
+        elif request.get("op") == "derive":
+            counter, size = request["counter"], request.get("size", 1024)
+            assert _is_int(counter) and counter >= 0, (
+                "Counter must be a non-negative int."
+            )
+            assert _is_int(size) and size >= 1, "Size must be a positive int."
+            key = await deriver.derive_key(
+                [bytes.fromhex(secret) for secret in request["secrets"]],
+                bytes.fromhex(request["salt"]),
+                counter,
+                size,
+            )
+            stats.keys += 1
+            stats.latencies.append(time.perf_counter() - start)
+            response = {"key": key.hex()}
+        else:
+            raise ValueError(f"Unknown op {request.get('op')!r}.")
+    except Exception as e:  # noqa: BLE001 - every request gets a response
+        stats.errors += 1
+        message = f"missing {e}" if isinstance(e, KeyError) else str(e)
+        response = {"error": message or type(e).__name__}
+    finally:
+        stats.in_flight -= 1
+    if isinstance(request, dict) and "id" in request:
+        response = {"id": request["id"], **response}
+    writer.write(_frame(response))
+    await writer.drain()
+
+
+class Client:
+    """
+    A connection to a daemon. derive_keys pipelines up to `window` requests.
+    Raises FileNotFoundError or ConnectionRefusedError if no daemon is running, and
+    PermissionError if the socket belongs to another user; nothing is sent then.
+    """
+
+    def __init__(self, path: str | None = None, window=64):
+        assert window >= 1, "Window must be a positive int."
+        self.window = window
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self._socket.connect(path or default_socket_path())
+            if _peer_uid(self._socket) != os.getuid():
+                raise PermissionError("The daemon socket belongs to another user.")
+        except OSError:
+            self._socket.close()
+            raise
+        self._file = self._socket.makefile("rwb")
+
+    def derive_key(
+        self, secrets: list[bytes], salt: bytes, counter: int, size=1024
+    ) -> bytes:
+        """derive_key on the daemon. Invalid requests raise ValueError."""
+        return self.derive_keys([(secrets, salt, counter)], size)[0]
+
+    def derive_keys(
+        self, jobs: Iterable[tuple[list[bytes], bytes, int]], size=1024
+    ) -> list[bytes]:
+        """
+        The key of every (secrets, salt, counter) job, in job order. If requests
+        fail, ValueError is raised with the first error once all responses are in.
+        """
+        keys, errors = {}, {}
+        sent = 0
+        for secrets, salt, counter in jobs:
+            if sent - len(keys) - len(errors) >= self.window:
+                self._receive(keys, errors)
+            self._send({
+                "id": sent,
+                "op": "derive",
+                "secrets": [secret.hex() for secret in secrets],
+                "salt": salt.hex(),
+                "counter": counter,
+                "size": size,
+            })
+            sent += 1
+        while len(keys) + len(errors) < sent:
+            self._receive(keys, errors)
+        if errors:
+            raise ValueError(errors[min(errors)])
+        return [keys[i] for i in range(sent)]
+
+    def stats(self) -> dict:
+        """The daemon's counters (see ServerStats)."""
+        self._send({"id": "stats", "op": "stats"})
+        return self._read()["stats"]
+
+    def close(self) -> None:
+        self._file.close()
+        self._socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _send(self, message: dict) -> None:
+        self._file.write(_frame(message))
+        self._file.flush()
+
+    def _read(self) -> dict:
+        header = self._file.read(FRAME.size)
+        if len(header) < FRAME.size:
+            raise ConnectionError("The daemon closed the connection.")
+        return json.loads(self._file.read(FRAME.unpack(header)[0]))
+
+    def _receive(self, keys: dict, errors: dict) -> None:
+        """Store the next response by id in `keys`, or its message in `errors`."""
+        response = self._read()
+        if "error" in response:
+            errors[response["id"]] = response["error"]
+        else:
+            keys[response["id"]] = bytes.fromhex(response["key"])
+
+
+def derive_key_via_daemon(
+    secrets: list[bytes],
+    salt: bytes,
+    counter: int,
+    size=1024,
+    path: str | None = None,
+) -> bytes:
+    """
+    derive_key on the daemon listening on `path` (default_socket_path() by
+    default), or in this process if no daemon of this user is running.
+    """
+    try:
+        client = Client(path)
+    except (FileNotFoundError, ConnectionRefusedError, PermissionError):
+        return derive_key(secrets, salt, counter, size=size)
+    with client:
+        return client.derive_key(secrets, salt, counter, size)
+
+
+async def _read_frame(reader) -> bytes | None:
+    """The next frame's payload, or None at the end of the stream."""
+    try:
+        header = await reader.readexactly(FRAME.size)
+    except asyncio.IncompleteReadError:
+        return None
+    (length,) = FRAME.unpack(header)
+    if length > MAX_FRAME:
+        raise ValueError(f"Frame of {length} bytes exceeds {MAX_FRAME}.")
+    return await reader.readexactly(length)
+
+
+def _frame(message: dict) -> bytes:
+    payload = json.dumps(message).encode()
+    return FRAME.pack(len(payload)) + payload
+
+
+def _private_directory(directory: str) -> None:
+    """Create `directory` with mode 0700, or check that an existing one is private."""
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    info = os.stat(directory)
+    if info.st_uid != os.getuid() or info.st_mode & 0o077:
+        raise PermissionError(f"{directory} must be private to this user.")
+
+
+def _peer_uid(sock: socket.socket) -> int:
+    """The user id of the process at the other end of a connected Unix socket."""
+    if hasattr(socket, "SO_PEERCRED"):  # Linux
+        creds = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, PEERCRED.size)
+        return PEERCRED.unpack(creds)[1]
+    # elsewhere, the owner of the socket file the daemon created
+    return os.stat(sock.getpeername()).st_uid
+
+
+def _is_int(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _is_listening(path: str) -> bool:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(path)
+        except OSError:
+            return False
+    return True
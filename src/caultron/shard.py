@@ -0,0 +1,246 @@
+"""
+Derivation of a counter range split into shards, e.g. over several machines.
+
+A manifest (JSON) describes the range, the salt, the universe size and the
+counters of each shard; it holds no secret, only a short check that every node
+uses the same password. The check is a hash of the first key, so testing a
+password guess against it costs a full derivation. Each node derives its shards
+into shard files and the shard files are merged into one ordered key file.
+
+Shard files are a fixed 64-byte header followed by the 64-byte keys of the
+shard's counters, in order. Keys are appended and synced as they are derived,
+so an interrupted node resumes after the last complete key. Shard files hold
+keys and must be protected like them.
+"""
+
+import hashlib
+import json
+import os
+import struct
+from itertools import pairwise
+from typing import NamedTuple
+
+from .batch import derive_keys
+from .ca import derive_key
+
+MAGIC = b"CAULSHRD"
+VERSION = 1
+HEADER = struct.Struct("<8sIIQQQ8s")  # magic, version, index, size, first, last, check
+HEADER_SIZE = 64
+KEY_SIZE = 64  # sha512 digests
+
+
+class Manifest(NamedTuple):
+    salt: bytes
+    size: int
+    shards: list[tuple[int, int]]  # (first, last) counters per shard, inclusive
+    check: bytes  # identifies the secrets without revealing them
+
+    @property
+    def counters(self) -> range:
+        return range(self.shards[0][0], self.shards[-1][1] + 1)
+
+
+class ShardHeader(NamedTuple):
+    index: int
+    size: int
+    first: int
+    last: int
+    check: bytes
+    done: int  # keys derived so far
+
+    @property
+    def complete(self) -> bool:
+        return self.done == self.last - self.first + 1
+
+
+def plan(
+    secrets: list[bytes], salt: bytes, counters: range, shards: int, size=1024
+) -> Manifest:
+    """Split `counters` into `shards` contiguous shards of (almost) equal length."""
+    assert isinstance(counters, range) and counters.step == 1 and len(counters), (
+        "Counters must be a non-empty range with step 1."
+    )
+    assert 1 <= shards <= len(counters), (
+        "Shards must be a positive int, at most the number of counters."
+    )
+    assert _is_int(size) and size >= 1, "Size must be a positive int."
+    bounds = [counters.start + len(counters) * i // shards for i in range(shards + 1)]
+    return Manifest(
+        salt,
+        size,
+        [(a, b - 1) for a, b in pairwise(bounds)],
+        _check(secrets, salt, counters.start, size),
+    )
+
+
+def save_manifest(path: str | os.PathLike, manifest: Manifest) -> None:
+    with open(path, "w") as f:
+        json.dump(
+            {
+                "format": "caultron-shards",
+                "version": VERSION,
+                "salt": manifest.salt.hex(),
+                "size": manifest.size,
+                "check": manifest.check.hex(),
+                "shards": manifest.shards,
+            },
+            f,
+            indent=1,
+        )
+        f.write("\n")
+
+
+def load_manifest(path: str | os.PathLike) -> Manifest:
+    try:
+        with open(path) as f:
+            data = json.load(f)
+        assert data["format"] == "caultron-shards" and data["version"] == VERSION
+        manifest = Manifest(
+            bytes.fromhex(data["salt"]),
+            data["size"],
+            [(first, last) for first, last in data["shards"]],
+            bytes.fromhex(data["check"]),
+        )
+        assert _is_int(manifest.size) and manifest.size >= 1
+        assert manifest.shards and all(
+            _is_int(a) and _is_int(b) and 0 <= a <= b < 2**64
+            for a, b in manifest.shards
+        )
+    except (AssertionError, KeyError, TypeError, ValueError) as e:
+        raise ValueError(
+            f"{path} is not a CAultron shard manifest (version {VERSION})."
+        ) from e
+    for (_, last), (first, _) in pairwise(manifest.shards):
+        if first != last + 1:
+            raise ValueError(f"{path}: shards must cover consecutive counters.")
+    return manifest
+
+
+def derive_shard(
+    secrets: list[bytes],
+    manifest: Manifest,
+    index: int,
+    path: str | os.PathLike,
+    workers: int | None = 1,
+    chunksize: int = 1,
+    engine="packed",
+    every: int = 64,
+) -> int:
+    """
+    Derive the keys of shard `index` into the shard file `path`, syncing it every
+    `every` keys. If `path` already holds part of the shard, only the missing keys
+    are derived. Returns the number of keys derived by this call.
+    """
+    assert 0 <= index < len(manifest.shards), "No such shard in the manifest."
+    assert every >= 1, "Every must be a positive int."
+    first, last = manifest.shards[index]
+    check = _check(secrets, manifest.salt, manifest.counters.start, manifest.size)
+    if check != manifest.check:
+        raise ValueError("The manifest belongs to other secrets.")
+    expected = (index, manifest.size, first, last, manifest.check)
+    if os.path.exists(path):
+        header = read_shard_header(path)
+        if header[:5] != expected:
+            raise ValueError(f"{path} holds another shard.")
+        # drop a key that was cut off by an interruption
+        os.truncate(path, HEADER_SIZE + header.done * KEY_SIZE)
+        done = header.done
+    else:
+        with open(path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, *expected).ljust(HEADER_SIZE, b"\0"))
+        done = 0
+
+    keys = derive_keys(
+        secrets,
+        manifest.salt,
+        range(first + done, last + 1),
+        size=manifest.size,
+        workers=workers,
+        chunksize=chunksize,
+        engine=engine,
+    )
+    derived = 0
+    with open(path, "ab") as f:
+        for derived, key in enumerate(keys, 1):
+            f.write(key)
+            if derived % every == 0:
+                f.flush()
+                os.fsync(f.fileno())
+        f.flush()
+        os.fsync(f.fileno())
+    return derived
+
+
+def read_shard_header(path: str | os.PathLike) -> ShardHeader:
+    """The header of a shard file and the number of complete keys it holds."""
+    with open(path, "rb") as f:
+        data = f.read(HEADER_SIZE)
+        length = os.fstat(f.fileno()).st_size
+    if len(data) < HEADER_SIZE:
+        raise ValueError(f"{path} is not a CAultron shard file (version {VERSION}).")
+    magic, version, index, size, first, last, check = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{path} is not a CAultron shard file (version {VERSION}).")
+    done = min((length - HEADER_SIZE) // KEY_SIZE, last - first + 1)
+    return ShardHeader(index, size, first, last, check, done)
+
+
+def merge_shards(
+    manifest: Manifest,
+    paths: list[str | os.PathLike],
+    out: str | os.PathLike,
+    jsonl=False,
+) -> int:
+    """
+    Check that the shard files hold every key of the manifest exactly once and
+    write the keys in counter order to `out`: raw 64-byte keys, or JSON lines
+    with "counter" and "key" (hex). `out` is only replaced once all shards are
+    found valid. Returns the number of keys.
+    """
+    found = {}
+    for path in paths:
+        header = read_shard_header(path)
+        if header.index >= len(manifest.shards) or (
+            header.size,
+            header.first,
+            header.last,
+            header.check,
+        ) != (manifest.size, *manifest.shards[header.index], manifest.check):
+            raise ValueError(f"{path} does not belong to this manifest.")
+        if header.index in found:
+            raise ValueError(f"{path} and {found[header.index]} hold the same shard.")
+        if not header.complete:
+            raise ValueError(
+                f"{path} is incomplete: {header.done} of "
+                f"{header.last - header.first + 1} keys."
+            )
+        found[header.index] = path
+    missing = [i for i in range(len(manifest.shards)) if i not in found]
+    if missing:
+        raise ValueError(f"Missing shards: {', '.join(map(str, missing))}.")
+
+    tmp = f"{os.fspath(out)}.tmp"
+    with open(tmp, "w" if jsonl else "wb") as f:
+        for index, (first, last) in enumerate(manifest.shards):
+            with open(found[index], "rb") as shard:
+                shard.seek(HEADER_SIZE)
+                for counter in range(first, last + 1):
+                    key = shard.read(KEY_SIZE)
+                    if jsonl:
+                        f.write(json.dumps({"counter": counter, "key": key.hex()}))
+                        f.write("\n")
+                    else:
+                        f.write(key)
+    os.replace(tmp, out)
+    return len(manifest.counters)
+
+
+def _is_int(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _check(secrets: list[bytes], salt: bytes, counter: int, size: int) -> bytes:
+    # bound to a full derivation, so the manifest is no cheap password oracle
+    key = derive_key(secrets, salt, counter, size=size)
+    return hashlib.sha256(b"caultron shard" + key).digest()[:8]
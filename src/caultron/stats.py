@@ -0,0 +1,88 @@
+"""
+Optional instrumentation of a single key derivation.
+"""
+
+from dataclasses import dataclass, field
+
+
+@dataclass
+class DeriveStats:
+    """
+    Filled in by derive_key(..., stats=DeriveStats()); derive_key overwrites every
+    field, so one object can be reused for several calls.
+
+    The per-step lists are indexed by step - 1 and times are in seconds. With the
+    packed engine every step is a kernel call of its own instead of a batch, so an
+    instrumented derivation is somewhat slower than an uninstrumented one; inject_s
+    is the mask generation, and the XOR of the mask and the rotation check are part
+    of evolve_s (entropy_s is 0).
+    """
+
+    per_step = True  # the derive loops run one step per kernel call
+
+    engine: str = ""
+    size: int = 0
+    counter: int = 0
+    mid: int = 0
+    end: int = 0
+    inject_s: list[float] = field(default_factory=list)
+    evolve_s: list[float] = field(default_factory=list)
+    entropy_s: list[float] = field(default_factory=list)  # incl. the rotation check
+    live: list[int] = field(default_factory=list)  # live cells after evolving
+    rotated: list[bool] = field(default_factory=list)  # meta_rule rotated after step
+    hash_s: float = 0.0  # midpoint and endpoint hashing, incl. re-injection
+    total_s: float = 0.0
+
+    @property
+    def steps(self) -> int:
+        return len(self.inject_s)
+
+    @property
+    def rotations(self) -> int:
+        """Number of meta_rule rotations."""
+        return sum(self.rotated)
+
+    def summary(self) -> dict[str, int | float | str]:
+        """Flat totals, e.g. for a metrics exporter."""
+        return {
+            "engine": self.engine,
+            "size": self.size,
+            "counter": self.counter,
+            "mid": self.mid,
+            "end": self.end,
+            "steps": self.steps,
+            "rotations": self.rotations,
+            "inject_s": sum(self.inject_s),
+            "evolve_s": sum(self.evolve_s),
+            "entropy_s": sum(self.entropy_s),
+            "hash_s": self.hash_s,
+            "total_s": self.total_s,
+        }
+
+    def _start(self, engine: str, size: int, counter: int, mid: int, end: int):
+        self.__init__(engine, size, counter, mid, end)
+
+    def _step(self, inject_s, evolve_s, entropy_s, live, rotated):
+        self.inject_s.append(inject_s)
+        self.evolve_s.append(evolve_s)
+        self.entropy_s.append(entropy_s)
+        self.live.append(int(live))
+        self.rotated.append(bool(rotated))
+
+    def _hash(self, hash_s):
+        self.hash_s += hash_s
+
+
+class _NoStats:
+    """The recorder of uninstrumented derivations: records nothing."""
+
+    per_step = False
+
+    def _step(self, inject_s, evolve_s, entropy_s, live, rotated):
+        pass
+
+    def _hash(self, hash_s):
+        pass
+
+
+NO_STATS = _NoStats()
@@ -0,0 +1,78 @@
+"""
+TAN lists from a single evolving universe (spec 09).
+
+Instead of one full derivation per key, one universe is evolved once and a TAN
+is taken whenever a seed-determined region of the injected cells matches a
+seed-determined pattern. TAN j is the SHA-512 of the state after that step, so
+TAN j costs an attacker the whole evolution up to it, while issuing N TANs costs
+one evolution of about N * 2**PATTERN_BITS steps.
+
+The public hint tables of spec 09 are not implemented.
+"""
+
+import hashlib
+from typing import Generator
+
+import numpy as np
+
+from .ca import _packed_point, xor_blocks
+from .chacha20 import chacha20_keystream
+from .packed import _step_packed_numba, _window, n_words
+from .rules import rule_schedule
+
+PATTERN_BITS = 4  # a TAN every 2**PATTERN_BITS steps on average
+_PATTERN_MASK = (1 << PATTERN_BITS) - 1
+
+
+def derive_tan_list(
+    secrets: list[bytes], salt: bytes, count: int, size=1024
+) -> Generator[bytes, None, None]:
+    """
+    Yield `count` 64-byte TANs from one evolution of a universe of `size` cells.
+    The list is deterministic, and a shorter list is a prefix of a longer one.
+    """
+    assert count >= 0, "Count must be a non-negative int."
+    # a smaller universe cannot hold the region, and its pattern may never match
+    assert size >= PATTERN_BITS, f"Size must be at least {PATTERN_BITS}."
+    seed = xor_blocks(*secrets, hashlib.sha256(b"caultron tan list").digest(), salt)
+    words = np.zeros(n_words(size), dtype=np.uint64)
+    spare = np.empty_like(words)
+    schedule = rule_schedule(int.from_bytes(seed[:4], "big"))
+    k = 0
+    i = 0
+    for j in range(count):
+        region, pattern = _halting_condition(seed, j, size)
+        while True:
+            i += 1
+            keystream = chacha20_keystream(size, seed, f"ts={i:09d}".encode())
+            live, k = _step_packed_numba(
+                words,
+                spare,
+                keystream,
+                size,
+                k,
+                schedule.tables,
+                schedule.flags,
+            )
+            # `words` now holds the injected state before evolution. Its cells mix
+            # the evolved state with the keystream, so the region matches with
+            # probability 2**-PATTERN_BITS per step even under rules whose output
+            # no longer changes.
+            cells = int(_window(words, size, region, PATTERN_BITS, 0))
+            words, spare = spare, words
+            if cells & _PATTERN_MASK == pattern:
+                break
+        words, live, tan = _packed_point(
+            words,
+            live,
+            size,
+            seed,
+            f"tk{j:010d}".encode(),  # 12-byte nonce
+        )
+        yield tan
+
+
+def _halting_condition(seed: bytes, j: int, size: int) -> tuple[int, int]:
+    """The first cell of the region TAN j waits for and the pattern it must match."""
+    digest = hashlib.sha256(seed + j.to_bytes(8, "big")).digest()
+    return int.from_bytes(digest[:8], "big") % size, digest[8] & _PATTERN_MASK
@@ -1,28 +1,54 @@
 import hashlib
-import math
+import os
 
-import matplotlib.pyplot as plt
 import numpy as np
 
-from .ca import derive_key, evolve, inject_seed, prepare_secrets
+from .ca import derive_key, prepare_secrets
+from .history import create_history, iter_ca, row_bytes
+from .rules import compile_rule
 
 
-def run_ca(seed, steps=100, size=1024):
+def run_ca(seed, steps=100, size=1024, out=None):
     """
     Run the CAultron cellular automaton with a given seed for a specified number of steps.
     The seed must be 32 bytes (256 bits).
     Returns a 2D numpy array of states, where each row is a state at a time step.
+
+    With `out`, rows are written bit-packed (see caultron.history) instead: `out` is
+    either a preallocated (steps, (size + 7) // 8) uint8 array or a path, in which
+    case a memory-mapped history file is created there. Returns `out` (the memmap for
+    a path). Use iter_ca to consume the states lazily without storing them.
     """
-    state = np.zeros(size, dtype=bool)
-    states = []
-    for x in range(steps):
-        state = inject_seed(state, seed, nonce=f"bits={x:<12}".encode()[:12])
-        state = evolve(state, seed)
-        states.append(state.copy())
-    return np.array(states)
+    if out is None:
+        states = np.empty((steps, size), dtype=bool)
+        for x, state in enumerate(iter_ca(seed, steps, size)):
+            states[x] = state
+        return states
+    if isinstance(out, (str, os.PathLike)):
+        out = create_history(out, seed, steps, size)
+    assert out.shape == (steps, row_bytes(size)) and out.dtype == np.uint8, (
+        f"Output must be a ({steps}, {row_bytes(size)}) uint8 array."
+    )
+    for x, row in enumerate(iter_ca(seed, steps, size, packed=True)):
+        out[x] = row
+    if isinstance(out, np.memmap):
+        out.flush()
+    return out
+
+
+def _pyplot():
+    """matplotlib is optional and only needed for plotting; import it on first use."""
+    try:
+        import matplotlib.pyplot as plt
+    except ImportError as e:
+        raise ImportError(
+            "Plotting requires matplotlib: pip install caultron[plot]"
+        ) from e
+    return plt
 
 
 def visualize_ca(states):
+    plt = _pyplot()
     plt.figure(figsize=(10, 6))
     plt.imshow(states, cmap="binary", interpolation="nearest", aspect="auto")
     plt.xlabel("Cell")
@@ -37,21 +63,14 @@ def print_rule_for_seed(seed):
     The seed must be 32 bytes (256 bits).
     """
     assert isinstance(seed, bytes) and len(seed) == 32, "Seed must be 32 bytes."
-    meta_rule = seed[:4]
-    rule_bits = int.from_bytes(meta_rule, "big")
-    core_rule = (rule_bits >> 20) & 0xFF  # bits 20-27
-    neighborhood_size = ((rule_bits >> 18) & 0x3) + 3  # bits 18-19, values 0-3 → 3-6
-    boundary = (rule_bits >> 17) & 0x1  # bit 17
-    inversion = (rule_bits >> 16) & 0x1  # bit 16
-    modulation = (rule_bits >> 8) & 0xFF  # bits 8-15
-    temporal = rule_bits & 0xFF  # bits 0-7
-
-    print(f"Core Rule: {core_rule:08b}")
-    print(f"Neighborhood Size: {neighborhood_size}")
-    print(f"Boundary: {boundary}")
-    print(f"Inversion: {inversion}")
-    print(f"Modulation: {modulation:08b}")
-    print(f"Temporal: {temporal:08b}")
+    rule = compile_rule(int.from_bytes(seed[:4], "big"))
+
+    print(f"Core Rule: {rule.core_rule:08b}")
+    print(f"Neighborhood Size: {rule.neighborhood_size}")
+    print(f"Boundary: {rule.boundary}")
+    print(f"Inversion: {rule.inversion}")
+    print(f"Modulation: {rule.modulation:08b}")
+    print(f"Temporal: {rule.temporal:08b}")
     print("====================")
 
 
@@ -60,18 +79,21 @@ def calculate_entropy_per_state(states):
     Calculate the Shannon entropy (in bits) for each CA state (row of states array).
     Returns a 1D numpy array of entropy values, one per state.
     """
-    entropies = []
-    for row in states:
-        p1 = np.mean(row)
-        p0 = 1 - p1
-        # Avoid log(0) by only including nonzero probabilities
-        entropy = 0.0
-        if p0 > 0:
-            entropy -= p0 * math.log2(p0)
-        if p1 > 0:
-            entropy -= p1 * math.log2(p1)
-        entropies.append(entropy * len(row))  # Total bits of entropy in the row
-    return np.array(entropies)
+    if len(states) == 0:
+        return np.empty(0)
+    states = np.asarray(states)
+    return _entropy_of_counts(np.count_nonzero(states, axis=1), states.shape[1])
+
+
+def _entropy_of_counts(live: np.ndarray, size: int) -> np.ndarray:
+    """Total bits of entropy of states of `size` cells with `live` live cells each."""
+    p1 = np.asarray(live, dtype=np.float64) / size
+    p0 = 1 - p1
+    # 0 * log2(0) is taken as 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        entropy = -np.where(p0 > 0, p0 * np.log2(p0), 0.0)
+        entropy -= np.where(p1 > 0, p1 * np.log2(p1), 0.0)
+    return entropy * size
 
 
 def visualize_entropy_over_time(states):
@@ -79,6 +101,7 @@ def visualize_entropy_over_time(states):
     Plot the entropy per state (row) over the evolution steps.
     """
     entropies = calculate_entropy_per_state(states)
+    plt = _pyplot()
     plt.figure(figsize=(10, 4))
     plt.plot(entropies, label="Entropy per state (bits)")
     plt.xlabel("Evolution Step")
@@ -123,6 +146,7 @@ def visualize_hamming_vs_counter(
     for f in (min, mean, median, stdev, sum):
         print(f.__name__, f"{f(distances)}")
 
+    plt = _pyplot()
     plt.figure(figsize=(10, 4))
     plt.plot(range(min_counter, max_counter + 1), distances, marker="o")
     plt.xlabel("Counter")
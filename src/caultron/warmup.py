@@ -0,0 +1,59 @@
+"""
+Ahead-of-time warm-up of the numba kernels.
+
+Every kernel is compiled with cache=True, so the first process to run it writes
+the machine code to numba's on-disk cache and later processes only load it.
+Running warm_up() once after installing (`python -m caultron warmup`) moves the
+multi-second compile out of the first real derivation. If the package directory
+is read-only, point NUMBA_CACHE_DIR at a writable directory first.
+"""
+
+import time
+
+import numpy as np
+
+
+def warm_up(size=64) -> float:
+    """
+    Compile (or load from the cache) every kernel by running each public code path
+    once on a tiny universe, so the cached signatures match real use. The kernels
+    of universes of PARALLEL_SIZE cells or more are called directly.
+    Returns the elapsed time in seconds.
+    """
+    from .batch import derive_keys_lockstep
+    from .ca import derive_key, evolve, inject_seed
+    from .chacha20 import chacha20_keystream, chacha20_keystreams
+    from .history import iter_ca
+    from .packed import (
+        _evolve_packed_parallel_into,
+        _steps_masked_parallel_numba,
+        injection_masks,
+        pack_state,
+        popcount,
+    )
+    from .rules import rule_schedule
+
+    start = time.perf_counter()
+    seed, salt = bytes(32), bytes(32)
+    for engine in ("bool", "packed"):
+        derive_key([seed], salt, 1, size=size, engine=engine)
+    derive_keys_lockstep([([seed], salt, 1), ([seed], salt, 2)], size=size)
+    bits = inject_seed(np.zeros(size, dtype=bool), seed)
+    evolve(bits, seed)
+    popcount(pack_state(bits))
+    chacha20_keystream(size, seed)
+    chacha20_keystreams(size, [seed], [bytes(12)])
+    for _ in iter_ca(seed, steps=2, size=size):
+        pass
+    # the huge-universe path, as _packed_steps runs it
+    words = pack_state(bits)
+    schedule = rule_schedule(1)
+    masks = injection_masks(size, seed, [bytes(12)], parallel=True)
+    spare = np.empty_like(words)
+    _steps_masked_parallel_numba(
+        words, spare, masks, size, 0, schedule.tables, schedule.flags
+    )
+    _evolve_packed_parallel_into(
+        words, spare, size, schedule.tables[0], *schedule.flags[0]
+    )
+    return time.perf_counter() - start
@@ -0,0 +1,82 @@
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from caultron.aio import AsyncDeriver, aderive_key
+from caultron.ca import derive_key, prepare_secrets
+
+SECRETS = prepare_secrets("password")
+SALT = bytes(range(32))
+
+
+def test_aderive_key_matches_derive_key():
+    async def derive_all():
+        return await asyncio.gather(
+            *(aderive_key(SECRETS, SALT, c, size=256) for c in range(1, 6))
+        )
+
+    keys = asyncio.run(derive_all())
+    assert keys == [derive_key(SECRETS, SALT, c, size=256) for c in range(1, 6)]
+
+
+def test_back_pressure_admits_all_eventually():
+    async def derive_all(deriver):
+        async with deriver:
+            return await asyncio.gather(
+                *(deriver.derive_key(SECRETS, SALT, c, size=64) for c in range(1, 5))
+            )
+
+    keys = asyncio.run(derive_all(AsyncDeriver(max_workers=2, max_pending=1)))
+    assert keys == [derive_key(SECRETS, SALT, c, size=64) for c in range(1, 5)]
+
+
+def test_cancel_stops_evolution():
+    deriver = AsyncDeriver(max_workers=1)
+
+    async def cancel_long_derivation():
+        task = asyncio.create_task(deriver.derive_key(SECRETS, SALT, 1, size=2**22))
+        await asyncio.sleep(0.2)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel_long_derivation())
+    start = time.perf_counter()
+    deriver.close(wait=True)
+    assert time.perf_counter() - start < 1.0
+
+
+def test_concurrent_parallel_derivations():
+    # workqueue, numba's fallback threading layer, aborts on concurrent launches
+    code = """
+import asyncio
+import caultron.ca
+from caultron.aio import AsyncDeriver
+from caultron.ca import derive_key, prepare_secrets
+
+caultron.ca.PARALLEL_SIZE = 1
+secrets = prepare_secrets("password")
+
+async def derive_all():
+    async with AsyncDeriver(max_workers=2) as deriver:
+        return await asyncio.gather(
+            *(deriver.derive_key(secrets, bytes(32), c, size=4096) for c in (1, 2))
+        )
+
+keys = asyncio.run(derive_all())
+print(keys == [derive_key(secrets, bytes(32), c, size=4096) for c in (1, 2)])
+"""
+    env = {**os.environ, "NUMBA_THREADING_LAYER": "workqueue"}
+    out = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        env=env,
+        check=False,
+    )
+    assert out.returncode == 0, out.stderr
+    assert out.stdout.strip() == "True"
@@ -0,0 +1,30 @@
+import numba
+
+from caultron import analysis
+from caultron.analysis import estimate, memory_per_guess
+
+
+def test_estimate_counts_guesses():
+    result = estimate(size=64, seconds=0.2, batch=3, workers=1)
+    assert result.guesses > 0 and result.guesses % 3 == 0
+    assert result.guesses_per_s == result.guesses_per_s_per_core > 0
+    assert 1 <= result.steps_per_guess <= 255
+    assert result.bytes_per_guess == memory_per_guess(64)
+
+
+def test_memory_per_guess_grows_with_size():
+    assert memory_per_guess(1 << 20) - memory_per_guess(1 << 19) == (1 << 19) * 5 // 4
+
+
+def test_workers_run_on_one_thread(monkeypatch):
+    threads = []
+
+    def guess_batch(size, batch, counter, prefix):
+        threads.append(numba.get_num_threads())
+        return batch
+
+    monkeypatch.setattr(analysis, "_guess_batch", guess_batch)
+    before = numba.get_num_threads()
+    estimate(size=64, seconds=0.01, batch=1, workers=1)
+    assert set(threads) == {1}
+    assert numba.get_num_threads() == before
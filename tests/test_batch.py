@@ -0,0 +1,93 @@
+import json
+
+import pytest
+
+from caultron.__main__ import main
+from caultron.batch import derive_json_lines, derive_keys, derive_keys_lockstep
+from caultron.ca import derive_key, prepare_secrets
+
+SECRETS = prepare_secrets("password", "pepper")
+SALT = bytes(range(32))
+
+
+@pytest.mark.parametrize("workers, chunksize", [(1, 1), (2, 1), (3, 4)])
+def test_derive_keys_matches_derive_key(workers, chunksize):
+    counters = list(range(1, 12))
+    expected = [derive_key(SECRETS, SALT, c, size=128) for c in counters]
+    keys = derive_keys(
+        SECRETS, SALT, counters, size=128, workers=workers, chunksize=chunksize
+    )
+    assert list(keys) == expected
+
+
+def test_derive_keys_keeps_counter_order():
+    counters = [9, 2, 7, 2]
+    keys = list(derive_keys(SECRETS, SALT, iter(counters), size=64, workers=2))
+    assert keys == [derive_key(SECRETS, SALT, c, size=64) for c in counters]
+    assert keys[1] == keys[3]
+
+
+def test_derive_keys_stops_early():
+    keys = derive_keys(SECRETS, SALT, range(1, 10_000), size=64, workers=2)
+    assert next(keys) == derive_key(SECRETS, SALT, 1, size=64)
+    keys.close()
+
+
+@pytest.mark.parametrize("size", [1, 64, 100, 512])
+def test_derive_keys_lockstep_matches_derive_key(size):
+    other = prepare_secrets("correct", "horse", "battery")
+    jobs = [(SECRETS, SALT, c) for c in range(1, 17)]
+    jobs += [(other, bytes(32), c) for c in (1, 5)]
+    assert derive_keys_lockstep(jobs, size=size) == [
+        derive_key(*job, size=size) for job in jobs
+    ]
+
+
+def test_derive_keys_lockstep_empty():
+    assert derive_keys_lockstep([], size=64) == []
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_derive_json_lines(workers):
+    salt = SALT.hex()
+    lines = [
+        json.dumps({"password": "pw", "salt": salt, "counter": 3, "size": 64}),
+        "",
+        json.dumps({"password": "pw", "salt": salt, "counter": 1, "id": 7}),
+        "{",
+        json.dumps({"password": "pw", "salt": "short", "counter": 1}),
+        json.dumps({"password": "pw", "salt": salt, "counter": -1}),
+        json.dumps({"password": "pw", "salt": salt, "counter": 1, "size": 0}),
+        json.dumps({"password": "pw", "salt": salt, "counter": 2**64}),
+        json.dumps({"password": "pw", "salt": salt, "counter": True}),
+    ]
+    results = [json.loads(r) for r in derive_json_lines(lines, 128, workers=workers)]
+    secrets = prepare_secrets("pw")
+    assert results[0] == {
+        "counter": 3,
+        "size": 64,
+        "key": derive_key(secrets, SALT, 3, size=64).hex(),
+    }
+    assert results[1]["id"] == 7
+    assert results[1]["key"] == derive_key(secrets, SALT, 1, size=128).hex()
+    assert [r["line"] for r in results[2:]] == [4, 5, 6, 7, 8, 9]
+    assert all("error" in r for r in results[2:])
+
+
+def test_cli_batch_counter_range(capsys):
+    main([
+        "batch",
+        "--counters",
+        "2-4",
+        "--password",
+        "pw",
+        "--salt",
+        SALT.hex(),
+        "--size",
+        "64",
+    ])
+    results = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert results == [
+        {"counter": c, "key": derive_key(prepare_secrets("pw"), SALT, c, size=64).hex()}
+        for c in (2, 3, 4)
+    ]
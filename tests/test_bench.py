@@ -0,0 +1,63 @@
+import json
+import subprocess
+import sys
+
+from caultron.bench import main
+
+
+def test_bench_writes_json(tmp_path):
+    path = tmp_path / "bench.json"
+    results = main([
+        "--sizes",
+        "64",
+        "--repeat",
+        "1",
+        "--min-time",
+        "0",
+        "--counters",
+        "1",
+        "--json",
+        str(path),
+    ])
+    data = json.loads(path.read_text())
+    assert len(data["results"]) == len(results)
+    names = {(r["name"], r["engine"]) for r in data["results"]}
+    assert {
+        ("evolve", "bool"),
+        ("evolve", "packed"),
+        ("derive_key", "lockstep"),
+        ("injection_masks", "packed"),
+        ("steps", "packed"),
+    } <= names
+    for r in data["results"]:
+        assert r["size"] == 64 and r["throughput"] > 0
+        if r["name"] == "derive_key":
+            assert r["extra"]["steps"] == r["extra"]["mid_end"][0][1] - 1
+
+
+def test_bench_only(tmp_path):
+    results = main([
+        "--sizes",
+        "64",
+        "--repeat",
+        "1",
+        "--min-time",
+        "0",
+        "--only",
+        "hash",
+    ])
+    assert {r.engine for r in results} == {"bool", "packed"}
+
+
+def test_fixtures_leave_kernels_uncompiled():
+    # otherwise the first call of a case would not include its compilation
+    code = (
+        "from caultron import chacha20, packed; from caultron.bench import cases; "
+        "cases(64); "
+        "print(chacha20._chacha20_blocks.signatures, "
+        "packed._steps_masked_numba.signatures)"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    assert out.stdout.strip() == "[] []"
@@ -0,0 +1,58 @@
+from caultron.ca import derive_key, prepare_secrets
+from caultron.cache import KeyCache
+
+SECRETS = prepare_secrets("password")
+SALT = bytes(range(32))
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_hits_and_misses():
+    cache = KeyCache(maxsize=4)
+    key = cache.derive_key(SECRETS, SALT, 1, size=64)
+    assert key == derive_key(SECRETS, SALT, 1, size=64)
+    assert cache.derive_key(SECRETS, SALT, 1, size=64) == key
+    assert cache.derive_key(SECRETS, SALT, 1, size=128) != key
+    info = cache.cache_info()
+    assert (info.hits, info.misses, info.currsize) == (1, 2, 2)
+
+
+def test_lru_eviction_zeroizes():
+    cache = KeyCache(maxsize=2)
+    cache.derive_key(SECRETS, SALT, 1, size=64)
+    cache.derive_key(SECRETS, SALT, 2, size=64)
+    first, second = (key for key, _ in cache._entries.values())
+    cache.derive_key(SECRETS, SALT, 1, size=64)  # 1 becomes most recently used
+    cache.derive_key(SECRETS, SALT, 3, size=64)  # evicts 2
+    assert any(first) and not any(second)
+    assert cache.cache_info().evictions == 1
+    cache.clear()
+    assert not any(first) and len(cache) == 0
+
+
+def test_ttl_expiry():
+    clock = FakeClock()
+    cache = KeyCache(ttl=10, clock=clock)
+    cache.derive_key(SECRETS, SALT, 1, size=64)
+    cache.derive_key(SECRETS, SALT, 2, size=64)
+    clock.now = 5
+    cache.derive_key(SECRETS, SALT, 1, size=64)
+    clock.now = 10
+    assert cache.purge() == 2
+    cache.derive_key(SECRETS, SALT, 1, size=64)
+    info = cache.cache_info()
+    assert (info.hits, info.misses, info.expirations) == (1, 3, 2)
+
+
+def test_index_does_not_contain_secrets():
+    cache = KeyCache()
+    cache.derive_key(SECRETS, SALT, 1, size=64)
+    (index,) = cache._entries
+    assert SECRETS[0] not in index and len(index) == 32
+    assert KeyCache()._index(SECRETS, SALT, 1, 64) != index
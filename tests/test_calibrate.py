@@ -0,0 +1,20 @@
+import numpy as np
+
+from caultron.__main__ import main
+from caultron.calibrate import calibrate, step_distribution
+
+
+def test_step_distribution():
+    steps = step_distribution()
+    assert len(steps) == 256 * 256
+    assert steps.min() == 1 and steps.max() == 255
+    assert np.median(steps) == 180
+
+
+def test_calibrate_small_target(capsys):
+    result = calibrate(5, counters=2)
+    assert result.measured[0][0] == 1024
+    assert 64 <= result.worst_size <= result.median_size
+    assert result.median_size % 64 == 0
+    main(["calibrate", "--target-ms", "5", "--counters", "2", "--check", "2"])
+    assert "for the median derivation" in capsys.readouterr().out
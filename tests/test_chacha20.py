@@ -2,9 +2,24 @@
 Test for ChaCha20 implementation with 12-byte nonce (RFC 8439 test vector).
 """
 
+from itertools import islice
+
 import pytest
 
-from caultron.chacha20 import chacha20_encrypt
+from caultron.chacha20 import (
+    chacha20_encrypt,
+    chacha20_keystream,
+    chacha20_keystreams,
+    yield_chacha20_xor_stream,
+)
+
+# RFC 8439, section 2.4.2 inputs
+RFC_KEY = bytes(range(32))
+RFC_NONCE = bytes.fromhex("000000000000004a00000000")
+RFC_PLAINTEXT = (
+    b"Ladies and Gentlemen of the class of '99: If I could offer you only one tip "
+    b"for the future, sunscreen would be it."
+)
 
 
 def test_chacha20_roundtrip():
@@ -110,6 +125,40 @@ def test_chacha20_nonce_key_reuse_determinism():
     assert decrypted == plaintext
 
 
+def test_chacha20_keystream_matches_generator():
+    for length in [0, 1, 63, 64, 65, 1000]:
+        for position in [0, 1, 2**32 - 100]:
+            expected = bytes(
+                islice(yield_chacha20_xor_stream(RFC_KEY, RFC_NONCE, position), length)
+            )
+            assert (
+                chacha20_keystream(length, RFC_KEY, RFC_NONCE, position).tobytes()
+                == expected
+            )
+
+
+def test_chacha20_encrypt_matches_generator():
+    keystream = yield_chacha20_xor_stream(RFC_KEY, RFC_NONCE, 1)
+    expected = bytes(a ^ b for a, b in zip(RFC_PLAINTEXT, keystream))
+    assert chacha20_encrypt(RFC_PLAINTEXT, RFC_KEY, RFC_NONCE, 1) == expected
+
+
+def test_chacha20_keystream_counter_overflow():
+    assert len(chacha20_keystream(64, RFC_KEY, RFC_NONCE, 2**32 - 1)) == 64
+    with pytest.raises(RuntimeError):
+        chacha20_keystream(65, RFC_KEY, RFC_NONCE, 2**32 - 1)
+
+
+def test_chacha20_keystreams_rows_match_keystream():
+    keys = [bytes([i]) * 32 for i in range(4)]
+    ivs = [bytes([i]) * 12 for i in range(4)]
+    for length in [0, 1, 100]:
+        streams = chacha20_keystreams(length, keys, ivs, 1)
+        assert streams.shape == (4, length)
+        for key, iv, row in zip(keys, ivs, streams):
+            assert row.tobytes() == chacha20_keystream(length, key, iv, 1).tobytes()
+
+
 if __name__ == "__main__":
     test_chacha20_roundtrip()
     test_chacha20_empty_plaintext()
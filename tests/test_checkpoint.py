@@ -0,0 +1,82 @@
+import pytest
+
+from caultron.ca import _derive_seed, derive_key, prepare_secrets
+from caultron.checkpoint import (
+    CHECK_STEPS,
+    _seed_check,
+    advance,
+    derive_key_resumable,
+    finish,
+    load_checkpoint,
+    new_checkpoint,
+    save_checkpoint,
+)
+
+SECRETS = prepare_secrets("password")
+SALT = bytes(range(32))
+
+
+@pytest.mark.parametrize("counter", [1, 2, 3, 4])
+def test_sliced_derivation_matches_derive_key(counter, tmp_path):
+    checkpoint = new_checkpoint(SECRETS, SALT, counter, size=200)
+    while not checkpoint.done:
+        checkpoint = advance(SECRETS, SALT, checkpoint, steps=37)
+        save_checkpoint(tmp_path / "ckpt", checkpoint)
+        checkpoint = load_checkpoint(tmp_path / "ckpt")
+    assert finish(SECRETS, SALT, checkpoint) == derive_key(
+        SECRETS, SALT, counter, size=200
+    )
+
+
+def test_advance_leaves_checkpoint_unchanged():
+    checkpoint = advance(SECRETS, SALT, new_checkpoint(SECRETS, SALT, 5, size=100), 3)
+    words = checkpoint.words.copy()
+    advance(SECRETS, SALT, checkpoint, 10)
+    assert (checkpoint.words == words).all()
+    assert finish(SECRETS, SALT, checkpoint) == derive_key(SECRETS, SALT, 5, size=100)
+
+
+def test_resumable_resumes_from_file(tmp_path):
+    path = tmp_path / "ckpt"
+    checkpoint = advance(SECRETS, SALT, new_checkpoint(SECRETS, SALT, 6, size=100), 50)
+    save_checkpoint(path, checkpoint)
+    key = derive_key_resumable(SECRETS, SALT, 6, path, size=100, every=16)
+    assert key == derive_key(SECRETS, SALT, 6, size=100)
+    assert not path.exists()
+
+
+def test_wrong_secrets_or_file(tmp_path):
+    checkpoint = new_checkpoint(SECRETS, SALT, 1, size=100)
+    with pytest.raises(ValueError):
+        advance(prepare_secrets("other"), SALT, checkpoint)
+    (tmp_path / "bad").write_bytes(b"\0" * 200)
+    with pytest.raises(ValueError):
+        load_checkpoint(tmp_path / "bad")
+    (tmp_path / "short").write_bytes(b"CAULCKPT")
+    with pytest.raises(ValueError, match="not a CAultron checkpoint"):
+        load_checkpoint(tmp_path / "short")
+
+
+def test_seed_check_costs_an_evolution(monkeypatch):
+    # the check depends on the evolution, not only on the seed
+    seed = _derive_seed(SECRETS, SALT, 1)
+    check = _seed_check(seed, 1, 100)
+    assert _seed_check(seed, 1, 200) != check
+    monkeypatch.setattr("caultron.checkpoint.CHECK_STEPS", CHECK_STEPS + 1)
+    assert _seed_check(seed, 1, 100) != check
+
+
+def test_resumable_checks_the_seed_once(tmp_path, monkeypatch):
+    calls = []
+
+    def seed_check(*args):
+        calls.append(args)
+        return _seed_check(*args)
+
+    monkeypatch.setattr("caultron.checkpoint._seed_check", seed_check)
+    path = tmp_path / "ckpt"
+    save_checkpoint(path, advance(SECRETS, SALT, new_checkpoint(SECRETS, SALT, 7), 9))
+    calls.clear()
+    key = derive_key_resumable(SECRETS, SALT, 7, path, every=4)
+    assert key == derive_key(SECRETS, SALT, 7)
+    assert len(calls) == 1
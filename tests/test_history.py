@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from caultron.ca import evolve, inject_seed
+from caultron.history import iter_ca, open_history, row_bytes, unpack_rows
+from caultron.visualize import run_ca
+
+SEED = bytes(range(100, 132))
+
+
+def reference_states(seed, steps, size):
+    state = np.zeros(size, dtype=bool)
+    states = []
+    for x in range(steps):
+        state = inject_seed(state, seed, nonce=f"bits={x:<12}".encode()[:12])
+        state = evolve(state, seed)
+        states.append(state.copy())
+    return np.array(states)
+
+
+@pytest.mark.parametrize("size", [1, 9, 64, 130])
+def test_run_ca_matches_reference(size):
+    states = run_ca(SEED, steps=12, size=size)
+    assert states.dtype == bool
+    assert (states == reference_states(SEED, 12, size)).all()
+
+
+def test_iter_ca_is_lazy():
+    rows = iter_ca(SEED, steps=10**9, size=100)
+    first = next(rows)
+    assert (first == run_ca(SEED, steps=1, size=100)[0]).all()
+    rows.close()
+
+
+def test_run_ca_into_preallocated_array():
+    out = np.zeros((15, row_bytes(77)), dtype=np.uint8)
+    assert run_ca(SEED, steps=15, size=77, out=out) is out
+    assert (unpack_rows(out, 77) == run_ca(SEED, steps=15, size=77)).all()
+    with pytest.raises(AssertionError):
+        run_ca(SEED, steps=16, size=77, out=out)
+
+
+def test_run_ca_into_history_file(tmp_path):
+    path = tmp_path / "run.cahist"
+    run_ca(SEED, steps=20, size=150, out=path)
+    header, rows = open_history(path)
+    assert header.seed == SEED
+    assert header.size == 150
+    assert header.steps == 20
+    assert (unpack_rows(rows, 150) == run_ca(SEED, steps=20, size=150)).all()
+
+
+def test_open_history_rejects_other_files(tmp_path):
+    path = tmp_path / "junk"
+    path.write_bytes(bytes(128))
+    with pytest.raises(ValueError):
+        open_history(path)
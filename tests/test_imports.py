@@ -0,0 +1,47 @@
+import subprocess
+import sys
+
+import pytest
+
+import caultron
+
+
+def test_import_is_lazy():
+    code = (
+        "import sys, caultron; "
+        "print(any(m in sys.modules for m in ('numba', 'matplotlib', 'caultron.ca')))"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    assert out.stdout.strip() == "False"
+
+
+def test_lazy_attributes_resolve():
+    from caultron.ca import derive_key
+
+    assert caultron.derive_key is derive_key
+    assert set(caultron.__all__) <= set(dir(caultron))
+    name = "no_such_name"
+    with pytest.raises(AttributeError):
+        getattr(caultron, name)
+
+
+def test_warmup_cli(capsys):
+    from caultron.__main__ import main
+
+    main(["warmup"])
+    assert capsys.readouterr().out.startswith("Kernels ready")
+
+
+def test_warm_up_compiles_parallel_kernels():
+    from caultron import packed
+    from caultron.warmup import warm_up
+
+    warm_up()
+    for kernel in (
+        packed._steps_masked_parallel_numba,
+        packed._evolve_packed_parallel_into,
+        packed._injection_masks_parallel_numba,
+    ):
+        assert kernel.signatures
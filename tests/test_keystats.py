@@ -0,0 +1,33 @@
+import os
+
+import numpy as np
+
+from caultron.ca import derive_key, prepare_secrets
+from caultron.keystats import KeyStatistics, analyze_counters
+
+SECRETS = prepare_secrets("password")
+SALT = bytes(range(32))
+
+
+def test_statistics_of_known_keys():
+    stats = KeyStatistics(bits=16)
+    for key in (b"\x00\x00", b"\xff\x00", b"\xff\x01"):
+        stats.add(key)
+    assert stats.weights[[0, 8, 9]].tolist() == [1, 1, 1]
+    assert stats.distances[[8, 1]].tolist() == [1, 1]
+    assert stats.ones.tolist() == [2] * 8 + [0] * 7 + [1]
+    assert stats.flips.tolist() == [1] * 8 + [0] * 7 + [1]
+    summary = stats.summary()
+    assert summary["keys"] == 3 and summary["distance_mean"] == 4.5
+
+
+def test_analyze_counters_streams_keys(tmp_path):
+    stats = analyze_counters(SECRETS, SALT, range(1, 21), size=64, workers=1)
+    expected = KeyStatistics()
+    for c in range(1, 21):
+        expected.add(derive_key(SECRETS, SALT, c, size=64))
+    assert stats.count == 20
+    assert np.array_equal(stats.flips, expected.flips)
+    assert stats.summary() == expected.summary()
+    paths = stats.save_plots(tmp_path)
+    assert len(paths) == 4 and all(os.path.getsize(path) for path in paths)
@@ -0,0 +1,211 @@
+import numpy as np
+import pytest
+
+import caultron.ca
+from caultron.ca import (
+    _derive_key_bool,
+    _derive_key_packed,
+    _evolve_rule,
+    _inject_seed_count,
+    bit_entropy,
+    derive_key,
+    evolve,
+    get_mid_end,
+    inject_seed,
+    prepare_secrets,
+)
+from caultron.chacha20 import chacha20_keystream
+from caultron.packed import (
+    CHUNK_WORDS,
+    _evolve_packed_into,
+    _evolve_packed_parallel_into,
+    evolve_packed,
+    inject_seed_packed,
+    injection_masks,
+    pack_state,
+    popcount,
+    unpack_state,
+)
+from caultron.rules import _count_entropy, _stagnates, compile_rule
+
+SIZES = [1, 2, 3, 5, 63, 64, 65, 127, 129, 300]
+
+
+def make_seed(
+    neighborhood_size, boundary, inversion, core=110, modulation=0x5A, temporal=3
+):
+    rule_bits = (
+        core << 20
+        | (neighborhood_size - 3) << 18
+        | boundary << 17
+        | inversion << 16
+        | modulation << 8
+        | temporal
+    )
+    return rule_bits.to_bytes(4, "big") + bytes(range(28))
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_pack_roundtrip(size):
+    bits = np.random.default_rng(size).integers(0, 2, size).astype(bool)
+    words = pack_state(bits)
+    assert words.dtype == np.uint64
+    assert len(words) == (size + 63) // 64
+    assert popcount(words) == bits.sum()
+    assert (unpack_state(words, size) == bits).all()
+
+
+@pytest.mark.parametrize("neighborhood_size", [3, 4, 5, 6])
+@pytest.mark.parametrize("boundary", [0, 1])
+@pytest.mark.parametrize("inversion", [0, 1])
+def test_evolve_packed_matches_evolve(neighborhood_size, boundary, inversion):
+    rng = np.random.default_rng(neighborhood_size * 4 + boundary * 2 + inversion)
+    for size in SIZES:
+        seed = make_seed(
+            neighborhood_size,
+            boundary,
+            inversion,
+            core=int(rng.integers(256)),
+            modulation=int(rng.integers(256)),
+            temporal=int(rng.integers(256)),
+        )
+        bits = rng.integers(0, 2, size).astype(bool)
+        expected = evolve(bits, seed)
+        words = evolve_packed(pack_state(bits), size, seed)
+        assert (unpack_state(words, size) == expected).all()
+        # padding bits past the end of the universe stay cleared
+        assert popcount(words) == expected.sum()
+
+
+def test_inject_seed_packed_matches_inject_seed():
+    seed = bytes(range(32))
+    for size in SIZES:
+        bits = np.zeros(size, dtype=bool)
+        expected = inject_seed(bits, seed, nonce=b"abcdefghijkl")
+        words = inject_seed_packed(pack_state(bits), size, seed, nonce=b"abcdefghijkl")
+        assert (unpack_state(words, size) == expected).all()
+
+
+@pytest.mark.parametrize("boundary", [0, 1])
+@pytest.mark.parametrize("neighborhood_size", [3, 6])
+def test_parallel_evolve_matches_serial(neighborhood_size, boundary):
+    # several chunks, the last one partial, with halos across every chunk border
+    size = 3 * CHUNK_WORDS * 64 + 37
+    rule = compile_rule(int.from_bytes(make_seed(neighborhood_size, boundary, 1)[:4]))
+    bits = np.random.default_rng(size).integers(0, 2, size).astype(bool)
+    words = pack_state(bits)
+    args = size, rule.table, rule.neighborhood_size, rule.boundary, rule.inversion
+    serial, parallel = np.empty_like(words), np.empty_like(words)
+    live = _evolve_packed_into(words, serial, *args)
+    assert _evolve_packed_parallel_into(words, parallel, *args) == live
+    assert (parallel == serial).all()
+
+
+def test_derive_key_parallel(monkeypatch):
+    secrets = prepare_secrets("password", "pepper")
+    salt = bytes(range(32))
+    expected = derive_key(secrets, salt, 5, size=1000, engine="bool")
+    monkeypatch.setattr(caultron.ca, "PARALLEL_SIZE", 1)
+    assert derive_key(secrets, salt, 5, size=1000, engine="packed") == expected
+
+
+@pytest.mark.parametrize("parallel", [False, True])
+def test_injection_masks_match_keystreams(parallel):
+    seed = bytes(range(32))
+    nonces = [f"n={n:010d}".encode() for n in range(5)]
+    for size in SIZES:
+        masks = injection_masks(size, seed, nonces, parallel)
+        assert masks.shape == (len(nonces), len(pack_state(np.zeros(size))))
+        for mask, nonce in zip(masks, nonces):
+            expected = pack_state(chacha20_keystream(size, seed, nonce) & 1)
+            assert (mask == expected).all()
+
+
+@pytest.mark.parametrize("budget", [1, 8 * 16 * 7])
+def test_derive_key_packed_mask_batches(monkeypatch, budget):
+    # one step per batch, and batches of 7 steps that straddle the midpoint
+    secrets = prepare_secrets("password", "pepper")
+    salt = bytes(range(32))
+    expected = derive_key(secrets, salt, 4, size=1000, engine="bool")
+    monkeypatch.setattr(caultron.ca, "MASK_BUDGET", budget)
+    assert derive_key(secrets, salt, 4, size=1000, engine="packed") == expected
+
+
+@pytest.mark.parametrize("size", [1, 64, 100, 1024])
+def test_derive_key_packed_engine(size):
+    secrets = prepare_secrets("password", "pepper")
+    salt = bytes(range(32))
+    for counter in (1, 2, 3):
+        assert derive_key(secrets, salt, counter, size=size, engine="packed") == (
+            derive_key(secrets, salt, counter, size=size, engine="bool")
+        )
+
+
+def test_derive_key_unknown_engine():
+    with pytest.raises(AssertionError):
+        derive_key(prepare_secrets("a", "b"), bytes(32), 1, engine="gpu")
+
+
+@pytest.mark.parametrize("mid, end", [(2, 9), (5, 6)])
+def test_packed_engine_reinjects_dead_universe(mid, end):
+    # rule 0 with no modulation/temporal bits kills every cell on each step,
+    # so both the midpoint and the final re-injection paths are taken
+    seed = bytes(4) + bytes(range(26)) + bytes([end, mid])
+    assert get_mid_end(seed) == (mid, end)
+    for size in (1, 64, 100):
+        assert _derive_key_packed(seed, 7, size, mid, end) == _derive_key_bool(
+            seed, 7, size, mid, end
+        )
+
+
+@pytest.mark.parametrize("size", [1, 7, 1024])
+def test_count_entropy_matches_bit_entropy(size):
+    for live in range(size + 1):
+        state = np.zeros(size, dtype=bool)
+        state[:live] = True
+        # numba's log2 may differ from numpy's in the last bit
+        assert _count_entropy(live, size) == pytest.approx(
+            bit_entropy(state), abs=1e-15
+        )
+
+
+@pytest.mark.parametrize("size", [7, 1024, 4096])
+def test_every_rotation_decision_matches_bit_entropy(size):
+    entropy = np.array([_count_entropy(live, size) for live in range(size + 1)])
+    expected = np.empty(size + 1)
+    for live in range(size + 1):
+        expected[live] = bit_entropy(np.arange(size) < live)
+    # the ulp differences never cross the threshold, for any pair of counts
+    assert (
+        (abs(entropy[:, None] - entropy) < 0.1)
+        == (abs(expected[:, None] - expected) < 0.1)
+    ).all()
+
+
+def test_popcount_full_words():
+    words = np.random.default_rng(0).integers(0, 2**64, 1000, dtype=np.uint64)
+    words[:3] = [0, 2**64 - 1, 1 << 63]
+    expected = int(np.unpackbits(words.view(np.uint8)).sum())
+    assert popcount(words) == expected
+
+
+def test_kernels_count_live_cells():
+    rng = np.random.default_rng(3)
+    for size in SIZES:
+        seed = make_seed(5, 1, 1, temporal=int(rng.integers(256)))
+        bits = rng.integers(0, 2, size).astype(bool)
+        state, live = _inject_seed_count(bits, seed, b"abcdefghijkl")
+        assert live == state.sum()
+        state, live = _evolve_rule(state, compile_rule(int.from_bytes(seed[:4], "big")))
+        assert live == state.sum()
+
+
+def test_stagnation_matches_bit_entropy():
+    rng = np.random.default_rng(4)
+    size = 200
+    for _ in range(500):
+        prev, live = rng.integers(0, size + 1, 2)
+        a = np.arange(size) < prev
+        b = np.arange(size) < live
+        expected = abs(bit_entropy(b) - bit_entropy(a)) < 0.1
+        assert _stagnates(size, prev, live) == expected
@@ -0,0 +1,104 @@
+import math
+import struct
+import zlib
+
+import numpy as np
+import pytest
+
+from caultron.__main__ import main
+from caultron.render import render_evolution_png, render_history_png, render_png
+from caultron.visualize import calculate_entropy_per_state, run_ca
+
+SEED = bytes(range(32))
+
+
+def read_png(path):
+    """The pixel rows of an 8-bit grayscale PNG without filters."""
+    data = path.read_bytes()
+    assert data[:8] == b"\x89PNG\r\n\x1a\n"
+    pos, idat = 8, b""
+    while pos < len(data):
+        (length,) = struct.unpack(">I", data[pos : pos + 4])
+        kind, body = data[pos + 4 : pos + 8], data[pos + 8 : pos + 8 + length]
+        assert struct.unpack(">I", data[pos + 8 + length : pos + 12 + length]) == (
+            zlib.crc32(kind + body),
+        )
+        if kind == b"IHDR":
+            width, height = struct.unpack(">II", body[:8])
+        elif kind == b"IDAT":
+            idat += body
+        pos += 12 + length
+    assert kind == b"IEND"
+    rows = np.frombuffer(zlib.decompress(idat), np.uint8).reshape(height, width + 1)
+    assert (rows[:, 0] == 0).all()
+    return rows[:, 1:]
+
+
+@pytest.mark.parametrize("size, steps", [(100, 50), (257, 31), (64, 1)])
+def test_tiles_are_live_cell_shares(tmp_path, size, steps):
+    states = run_ca(SEED, steps=steps, size=size)
+    result = render_png(states, tmp_path / "ca.png", size, steps, width=30, height=7)
+    image = read_png(tmp_path / "ca.png")
+    assert image.shape == (result.height, result.width)
+    cx, cy = result.cells_per_pixel, result.steps_per_pixel
+    for y in range(result.height):
+        for x in range(result.width):
+            tile = states[y * cy : (y + 1) * cy, x * cx : (x + 1) * cx]
+            assert image[y, x] == 255 - tile.sum() * 255 // tile.size
+
+
+def test_full_resolution_matches_states(tmp_path):
+    states = run_ca(SEED, steps=40, size=90)
+    render_png(states, tmp_path / "ca.png", 90, 40)
+    assert (read_png(tmp_path / "ca.png") == np.where(states, 0, 255)).all()
+
+
+def test_history_and_evolution_render_alike(tmp_path):
+    run_ca(SEED, steps=60, size=200, out=tmp_path / "history")
+    kwargs = {"width": 50, "height": 20, "entropy_width": 10}
+    render_history_png(tmp_path / "history", tmp_path / "a.png", **kwargs)
+    render_evolution_png(SEED, tmp_path / "b.png", steps=60, size=200, **kwargs)
+    render_png(run_ca(SEED, 60, 200), tmp_path / "c.png", 200, 60, **kwargs)
+    image = read_png(tmp_path / "a.png")
+    assert image.shape == (20, 50 + 2 + 10)
+    assert (image == read_png(tmp_path / "b.png")).all()
+    assert (image == read_png(tmp_path / "c.png")).all()
+
+
+def test_entropy_strip(tmp_path):
+    size = 16
+    states = np.zeros((3, size), dtype=bool)
+    states[1, :8] = True  # one bit per cell
+    states[2] = True
+    render_png(states, tmp_path / "ca.png", size, 3, entropy_width=10)
+    strip = read_png(tmp_path / "ca.png")[:, size:]
+    assert (strip[:, :2] == 255).all()
+    assert (strip[0, 2:] == 255).all() and (strip[2, 2:] == 255).all()
+    assert (strip[1, 2:] == 0).all()
+
+
+def test_state_count_is_checked(tmp_path):
+    states = run_ca(SEED, steps=5, size=64)
+    with pytest.raises(AssertionError, match="Only 5 of 6"):
+        render_png(states, tmp_path / "ca.png", 64, 6)
+
+
+def test_entropy_per_state_matches_definition():
+    states = np.random.default_rng(0).random((20, 77)) < np.linspace(0, 1, 20)[:, None]
+    expected = []
+    for row in states:
+        p = [q for q in (row.mean(), 1 - row.mean()) if q > 0]
+        expected.append(-sum(q * math.log2(q) for q in p) * len(row))
+    assert calculate_entropy_per_state(states) == pytest.approx(expected)
+    assert calculate_entropy_per_state(states)[[0, -1]].tolist() == [0.0, 0.0]
+
+
+def test_entropy_per_state_of_no_states():
+    assert calculate_entropy_per_state([]).shape == (0,)
+
+
+def test_render_cli(tmp_path, capsys):
+    out = tmp_path / "ca.png"
+    main(["render", str(out), "--seed", SEED.hex(), "--steps", "30", "--size", "64"])
+    assert "64x30 pixels" in capsys.readouterr().out
+    assert read_png(out).shape == (30, 64)
@@ -0,0 +1,68 @@
+from caultron.rules import (
+    ROTATIONS,
+    _next_rule,
+    _rotate_rule,
+    compile_rule,
+    rule_schedule,
+)
+from caultron.visualize import print_rule_for_seed
+
+
+def test_compile_rule_fields():
+    rule_bits = 110 << 20 | 2 << 18 | 1 << 17 | 0 << 16 | 0xA5 << 8 | 0x03
+    rule = compile_rule(rule_bits)
+    assert rule.bits == rule_bits
+    assert rule.core_rule == 110
+    assert rule.neighborhood_size == 5
+    assert rule.boundary == 1
+    assert rule.inversion == 0
+    assert rule.modulation == 0xA5
+    assert rule.temporal == 0x03
+    assert len(rule.table) == 2**5
+
+
+def test_compile_rule_elementary():
+    # neighborhood 3 without temporal shift is the plain Wolfram rule table
+    rule = compile_rule(30 << 20)
+    assert rule.table.tolist() == [0, 0, 0, 1, 1, 1, 1, 0]
+
+
+def test_compile_rule_is_cached_and_read_only():
+    assert compile_rule(0x0ABCDEF1) is compile_rule(0x0ABCDEF1)
+    assert not compile_rule(0x0ABCDEF1).table.flags.writeable
+
+
+def test_compile_rule_ignores_upper_bits():
+    low = compile_rule(0x0123ABCD)
+    high = compile_rule(0xF123ABCD)
+    assert high.bits == low.bits
+    assert (high.table == low.table).all()
+
+
+def test_rule_schedule_follows_rotation():
+    initial = 0xF123ABCD
+    schedule = rule_schedule(initial)
+    rule_bits = initial
+    k = 0
+    for _ in range(3 * ROTATIONS):
+        assert schedule.bits[k] == rule_bits
+        rule = compile_rule(rule_bits)
+        size = 2**rule.neighborhood_size
+        assert (schedule.tables[k, :size] == rule.table).all()
+        assert schedule.flags[k].tolist() == [
+            rule.neighborhood_size,
+            rule.boundary,
+            rule.inversion,
+        ]
+        rule_bits = _rotate_rule(rule_bits)
+        k = _next_rule(k)
+
+
+def test_print_rule_for_seed(capsys):
+    seed = (110 << 20 | 0xA5 << 8 | 0x03).to_bytes(4, "big") + bytes(28)
+    print_rule_for_seed(seed)
+    out = capsys.readouterr().out
+    assert "Core Rule: 01101110" in out
+    assert "Neighborhood Size: 3" in out
+    assert "Modulation: 10100101" in out
+    assert "Temporal: 00000011" in out
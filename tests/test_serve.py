@@ -0,0 +1,103 @@
+import asyncio
+import os
+import stat
+import threading
+
+import pytest
+
+from caultron import serve as serve_module
+from caultron.ca import derive_key, prepare_secrets
+from caultron.serve import Client, _private_directory, derive_key_via_daemon, serve
+
+SECRETS = prepare_secrets("password")
+SALT = bytes(range(32))
+
+
+@pytest.fixture
+def daemon(tmp_path):
+    """A daemon on a socket in tmp_path, running on an event loop in a thread."""
+    path = str(tmp_path / "caultron.sock")
+    loop = asyncio.new_event_loop()
+    ready, stop = threading.Event(), None
+
+    async def run():
+        nonlocal stop
+        stop, started = asyncio.Event(), asyncio.Event()
+        task = asyncio.create_task(serve(path, max_workers=2, ready=started, stop=stop))
+        await started.wait()
+        ready.set()
+        await task
+
+    thread = threading.Thread(target=loop.run_until_complete, args=(run(),))
+    thread.start()
+    assert ready.wait(30)
+    yield path
+    loop.call_soon_threadsafe(stop.set)
+    thread.join(30)
+    loop.close()
+
+
+def test_pipelined_keys_match_derive_key(daemon):
+    jobs = [(SECRETS, SALT, c) for c in range(1, 21)]
+    with Client(daemon, window=4) as client:
+        keys = client.derive_keys(jobs, size=128)
+        stats = client.stats()
+    assert keys == [derive_key(SECRETS, SALT, c, size=128) for c in range(1, 21)]
+    assert stats["keys"] == 20 and stats["errors"] == 0
+    assert stats["latency_max_ms"] >= stats["latency_p50_ms"] > 0
+
+
+def test_errors_do_not_break_the_connection(daemon):
+    with Client(daemon) as client:
+        with pytest.raises(ValueError, match="32 bytes"):
+            client.derive_keys([(SECRETS, b"short", 1), (SECRETS, SALT, 2)], size=64)
+        assert client.derive_key(SECRETS, SALT, 3, size=64) == derive_key(
+            SECRETS, SALT, 3, size=64
+        )
+        assert client.stats()["errors"] == 1
+
+
+def test_malformed_requests_get_an_error(daemon):
+    with Client(daemon) as client:
+        for counter, size in [(-1, 64), (1.5, 64), (True, 64), (1, 0), (1, "64")]:
+            with pytest.raises(ValueError, match="must be a"):
+                client.derive_key(SECRETS, SALT, counter, size)
+        client._send({"id": 0, "op": "derive", "secrets": 1, "salt": "", "counter": 1})
+        assert "error" in client._read()
+        assert client.stats()["errors"] == 6
+
+
+def test_socket_is_private_and_removed(daemon):
+    assert stat.S_IMODE(os.stat(daemon).st_mode) & 0o077 == 0
+    with pytest.raises(OSError, match="already listening"):
+        asyncio.run(serve(daemon))
+
+
+def test_fallback_without_daemon(tmp_path):
+    key = derive_key_via_daemon(SECRETS, SALT, 4, size=64, path=str(tmp_path / "no"))
+    assert key == derive_key(SECRETS, SALT, 4, size=64)
+
+
+def test_via_daemon(daemon):
+    key = derive_key_via_daemon(SECRETS, SALT, 5, size=64, path=daemon)
+    assert key == derive_key(SECRETS, SALT, 5, size=64)
+
+
+def test_default_directory_must_be_private(tmp_path):
+    directory = tmp_path / "caultron"
+    _private_directory(str(directory))
+    assert stat.S_IMODE(os.stat(directory).st_mode) == 0o700
+    directory.chmod(0o755)
+    with pytest.raises(PermissionError, match="private"):
+        _private_directory(str(directory))
+
+
+def test_no_secrets_for_another_users_daemon(daemon, monkeypatch):
+    monkeypatch.setattr(serve_module, "_peer_uid", lambda sock: os.getuid() + 1)
+    with pytest.raises(PermissionError):
+        Client(daemon)
+    key = derive_key_via_daemon(SECRETS, SALT, 6, size=64, path=daemon)
+    assert key == derive_key(SECRETS, SALT, 6, size=64)
+    monkeypatch.undo()
+    with Client(daemon) as client:
+        assert client.stats()["requests"] == 1  # only this one
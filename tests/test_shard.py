@@ -0,0 +1,142 @@
+import json
+
+import pytest
+
+from caultron.__main__ import main
+from caultron.batch import derive_keys
+from caultron.ca import prepare_secrets
+from caultron.shard import (
+    HEADER_SIZE,
+    KEY_SIZE,
+    derive_shard,
+    load_manifest,
+    merge_shards,
+    plan,
+    read_shard_header,
+    save_manifest,
+)
+
+SECRETS = prepare_secrets("password")
+SALT = bytes(range(32))
+SIZE = 64
+
+
+def test_plan_splits_evenly(tmp_path):
+    manifest = plan(SECRETS, SALT, range(10, 21), 3, size=SIZE)
+    assert manifest.shards == [(10, 12), (13, 16), (17, 20)]
+    save_manifest(tmp_path / "m.json", manifest)
+    assert load_manifest(tmp_path / "m.json") == manifest
+
+
+@pytest.mark.parametrize(
+    "change",
+    [
+        {"size": "64"},
+        {"size": 0},
+        {"size": True},
+        {"shards": [[1.5, 2], [3, 4]]},
+        {"shards": [[-3, 2], [3, 4]]},
+        {"shards": [[True, 2], [3, 4]]},
+        {"shards": [[1, 2], [3, 2**64]]},
+    ],
+)
+def test_load_manifest_rejects_bad_values(tmp_path, change):
+    save_manifest(tmp_path / "m.json", plan(SECRETS, SALT, range(1, 5), 2, size=SIZE))
+    data = json.loads((tmp_path / "m.json").read_text())
+    (tmp_path / "m.json").write_text(json.dumps({**data, **change}))
+    with pytest.raises(ValueError, match="not a CAultron shard manifest"):
+        load_manifest(tmp_path / "m.json")
+
+
+def test_plan_rejects_empty_universe(tmp_path):
+    with pytest.raises(AssertionError):
+        plan(SECRETS, SALT, range(1, 5), 2, size=0)
+    with pytest.raises(SystemExit, match="Size must be a positive int"):
+        main(
+            ["shard", "plan", str(tmp_path / "m.json"), "--counters", "1-4"]
+            + ["--shards", "2", "--password", "password", "--salt", SALT.hex()]
+            + ["--size", "0"]
+        )
+
+
+def test_check_costs_a_derivation():
+    # the check depends on the evolved universe, not on the seed alone
+    checks = {plan(SECRETS, SALT, range(1, 5), 2, size=size).check for size in (64, 65)}
+    assert len(checks) == 2
+
+
+def test_shards_merge_to_derive_keys(tmp_path):
+    manifest = plan(SECRETS, SALT, range(1, 12), 3, size=SIZE)
+    paths = [tmp_path / f"{i}.shard" for i in range(3)]
+    for index, path in reversed(list(enumerate(paths))):
+        derive_shard(SECRETS, manifest, index, path)
+    expected = list(derive_keys(SECRETS, SALT, range(1, 12), size=SIZE, workers=1))
+
+    assert merge_shards(manifest, paths, tmp_path / "keys") == 11
+    assert (tmp_path / "keys").read_bytes() == b"".join(expected)
+    merge_shards(manifest, paths, tmp_path / "keys.jsonl", jsonl=True)
+    lines = (tmp_path / "keys.jsonl").read_text().splitlines()
+    assert [json.loads(line) for line in lines] == [
+        {"counter": c, "key": key.hex()} for c, key in zip(range(1, 12), expected)
+    ]
+
+
+def test_interrupted_shard_resumes(tmp_path):
+    manifest = plan(SECRETS, SALT, range(1, 9), 1, size=SIZE)
+    path = tmp_path / "0.shard"
+    derive_shard(SECRETS, manifest, 0, path)
+    complete = path.read_bytes()
+    # interrupted in the middle of the fourth key
+    path.write_bytes(complete[: HEADER_SIZE + 3 * KEY_SIZE + 10])
+    assert read_shard_header(path).done == 3
+    assert derive_shard(SECRETS, manifest, 0, path) == 5
+    assert path.read_bytes() == complete
+    assert derive_shard(SECRETS, manifest, 0, path) == 0
+
+
+def test_merge_rejects_missing_and_incomplete_shards(tmp_path):
+    manifest = plan(SECRETS, SALT, range(1, 5), 2, size=SIZE)
+    paths = [tmp_path / "0.shard", tmp_path / "1.shard"]
+    for index, path in enumerate(paths):
+        derive_shard(SECRETS, manifest, index, path)
+    with pytest.raises(ValueError, match="Missing shards: 1"):
+        merge_shards(manifest, paths[:1], tmp_path / "keys")
+    with pytest.raises(ValueError, match="same shard"):
+        merge_shards(manifest, [paths[0], paths[0]], tmp_path / "keys")
+    paths[1].write_bytes(paths[1].read_bytes()[:-1])
+    with pytest.raises(ValueError, match="incomplete"):
+        merge_shards(manifest, paths, tmp_path / "keys")
+    assert not (tmp_path / "keys").exists()
+
+
+def test_shard_rejects_other_password_and_shard(tmp_path):
+    manifest = plan(SECRETS, SALT, range(1, 5), 2, size=SIZE)
+    with pytest.raises(ValueError, match="other secrets"):
+        derive_shard(prepare_secrets("other"), manifest, 0, tmp_path / "0.shard")
+    derive_shard(SECRETS, manifest, 0, tmp_path / "0.shard")
+    with pytest.raises(ValueError, match="another shard"):
+        derive_shard(SECRETS, manifest, 1, tmp_path / "0.shard")
+
+
+def test_shard_cli(tmp_path, capsys):
+    manifest = str(tmp_path / "m.json")
+    salt = SALT.hex()
+    main(
+        ["shard", "plan", manifest, "--counters", "3-6", "--shards", "2"]
+        + ["--password", "password", "--salt", salt, "--size", str(SIZE)]
+    )
+    for index in (0, 1):
+        main([
+            "shard",
+            "run",
+            manifest,
+            "--index",
+            str(index),
+            "--password",
+            "password",
+        ])
+    shards = [f"{manifest}.0.shard", f"{manifest}.1.shard"]
+    main(["shard", "merge", manifest, *shards, "--output", str(tmp_path / "keys")])
+    assert "4 keys" in capsys.readouterr().out
+    expected = derive_keys(SECRETS, SALT, range(3, 7), size=SIZE, workers=1)
+    assert (tmp_path / "keys").read_bytes() == b"".join(expected)
@@ -0,0 +1,23 @@
+import hashlib
+
+import numpy as np
+import pytest
+
+from caultron.ca import _calculate_key, state_to_bytes
+from caultron.packed import pack_state, packed_state_bytes
+
+
+def string_state_bytes(bits):
+    # the original bit-string serialization of _calculate_key
+    bitstring = "".join(map(str, bits.astype(np.uint8).tolist()))
+    bitstring += "0" * ((8 - len(bitstring) % 8) % 8)
+    return bytes(int(bitstring[i : i + 8], 2) for i in range(0, len(bitstring), 8))
+
+
+@pytest.mark.parametrize("size", [1, 7, 8, 9, 63, 64, 65, 1000])
+def test_state_to_bytes_matches_bitstring(size):
+    bits = np.random.default_rng(size).integers(0, 2, size).astype(bool)
+    expected = string_state_bytes(bits)
+    assert state_to_bytes(bits) == expected
+    assert packed_state_bytes(pack_state(bits), size).tobytes() == expected
+    assert _calculate_key(bits) == hashlib.sha512(expected).digest()
@@ -0,0 +1,29 @@
+import pytest
+
+from caultron.ca import _derive_seed, derive_key, get_mid_end, prepare_secrets
+from caultron.stats import DeriveStats
+
+SECRETS = prepare_secrets("password")
+SALT = bytes(range(32))
+
+
+@pytest.mark.parametrize("engine", ["bool", "packed"])
+def test_stats_do_not_change_key(engine):
+    stats = DeriveStats()
+    for counter in range(1, 4):
+        key = derive_key(SECRETS, SALT, counter, size=300, engine=engine, stats=stats)
+        assert key == derive_key(SECRETS, SALT, counter, size=300, engine=engine)
+        mid, end = get_mid_end(_derive_seed(SECRETS, SALT, counter))
+        assert (stats.counter, stats.mid, stats.end) == (counter, mid, end)
+        assert stats.steps == len(stats.live) == end - 1
+
+
+def test_engines_record_same_evolution():
+    bool_stats, packed_stats = DeriveStats(), DeriveStats()
+    derive_key(SECRETS, SALT, 7, size=200, engine="bool", stats=bool_stats)
+    derive_key(SECRETS, SALT, 7, size=200, engine="packed", stats=packed_stats)
+    assert bool_stats.live == packed_stats.live
+    assert bool_stats.rotated == packed_stats.rotated
+    summary = packed_stats.summary()
+    assert summary["rotations"] == sum(packed_stats.rotated)
+    assert summary["total_s"] >= summary["evolve_s"] > 0
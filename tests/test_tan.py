@@ -0,0 +1,40 @@
+from itertools import islice
+
+import pytest
+
+from caultron import tan
+from caultron.ca import prepare_secrets
+from caultron.rules import rule_schedule
+from caultron.tan import derive_tan_list
+
+SECRETS = prepare_secrets("password")
+SALT = bytes(range(32))
+
+
+def test_tan_list_is_deterministic_prefix():
+    tans = list(derive_tan_list(SECRETS, SALT, 20, size=300))
+    assert len(tans) == len(set(tans)) == 20
+    assert all(len(tan) == 64 for tan in tans)
+    assert list(derive_tan_list(SECRETS, SALT, 5, size=300)) == tans[:5]
+    assert list(islice(derive_tan_list(SECRETS, SALT, 100, size=300), 20)) == tans
+
+
+def test_tan_list_depends_on_inputs():
+    tans = list(derive_tan_list(SECRETS, SALT, 3, size=300))
+    assert tans != list(derive_tan_list(SECRETS, bytes(32), 3, size=300))
+    assert tans != list(derive_tan_list(prepare_secrets("other"), SALT, 3, size=300))
+    assert tans != list(derive_tan_list(SECRETS, SALT, 3, size=301))
+    assert list(derive_tan_list(SECRETS, SALT, 0)) == []
+
+
+def test_tan_list_reinjects_dead_universe(monkeypatch):
+    # rule 0 kills every cell on each step, so every TAN takes the re-injection path
+    monkeypatch.setattr(tan, "rule_schedule", lambda bits: rule_schedule(0))
+    tans = list(derive_tan_list(SECRETS, SALT, 3, size=64))
+    assert len(set(tans)) == 3
+
+
+def test_tan_list_needs_room_for_the_region():
+    with pytest.raises(AssertionError):
+        next(derive_tan_list(SECRETS, SALT, 1, size=3))
+    assert len(list(derive_tan_list(SECRETS, SALT, 2, size=4))) == 2